@@ -1,8 +1,12 @@
+import pandas as pd
 import streamlit as st
 from datetime import datetime
 
 from src.config import MONTHS, BUSINESS_UNITS, PAGES, MP_SUBCLASSES,get_agents_dict, YEAR_OPTIONS, YEAR_INDEX
 from src.data.agents import get_agents_df
+from src.data.preload import preload_tables
+from src.data.refresher import start_refresher
+from src.data.watcher import start_watcher
 
 
 from views.sales import render_sales
@@ -12,8 +16,18 @@ from views.trend import render_trend
 from views.purchases import render_purchases
 
 
+# Cached frames are shared read-only with every session, see src/utils/frame_cache.py
+pd.set_option('mode.copy_on_write', True)
+
+
 def main():
 
+    # Load all the ERP tables concurrently the first time the app runs
+    preload_tables()
+    # Then keep them current: a local SAI directory is watched, remote tables are checked on a schedule
+    if not start_watcher():
+        start_refresher()
+
     # Get agents from database
     agents = get_agents_df()
     agents_dict = get_agents_dict(agents)
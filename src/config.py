@@ -9,6 +9,75 @@ from typing import Dict
 ERP_DB_PATH = os.getenv("ERP_DB_PATH", "https://lap.blueberrieslab.com/files")
 # This makes it default to the remote API, but overridable (e.g. to local mocks) by env var.
 
+# Remote tables are streamed in chunks, the read timeout applies to each chunk, not to the whole file
+ERP_CONNECT_TIMEOUT = float(os.getenv("ERP_CONNECT_TIMEOUT", "10"))
+ERP_READ_TIMEOUT = float(os.getenv("ERP_READ_TIMEOUT", "60"))
+ERP_CHUNK_SIZE = int(os.getenv("ERP_CHUNK_SIZE", str(1024 * 1024)))
+# Times an interrupted download is resumed with an HTTP Range request
+ERP_MAX_RESUMES = int(os.getenv("ERP_MAX_RESUMES", "5"))
+# Connections kept open to the ERP file server, requests beyond it wait for a free one
+ERP_MAX_CONNECTIONS = int(os.getenv("ERP_MAX_CONNECTIONS", "8"))
+# Failed connections and 429/5xx responses are retried with exponential backoff (0.5s, 1s, 2s, ...)
+ERP_RETRIES = int(os.getenv("ERP_RETRIES", "3"))
+ERP_RETRY_BACKOFF = float(os.getenv("ERP_RETRY_BACKOFF", "0.5"))
+
+# Local copies of the remote tables, revalidated before reuse. Set it empty to disable the cache
+ERP_CACHE_DIR = os.getenv("ERP_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".erp_cache"))
+
+# Parquet snapshots of the loaded tables partitioned by year/month. Set it empty to disable them
+ERP_SNAPSHOT_DIR = os.getenv("ERP_SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".erp_snapshots"))
+
+# Decoded tables shared by the Streamlit processes of a host as memory-mapped Arrow files.
+# Empty keeps every table in the memory of each process
+ERP_SHARED_DIR = os.getenv("ERP_SHARED_DIR", "")
+# A process loading a table holds its lock, locks older than this were left by a dead process
+ERP_SHARED_LOCK_SECONDS = float(os.getenv("ERP_SHARED_LOCK_SECONDS", "600"))
+
+# Local .dbf files are memory-mapped. Disable it if the SAI directory is on a share where files
+# may be truncated while they are read
+ERP_MMAP = os.getenv("ERP_MMAP", "1") == "1"
+
+# Big detail tables can be decoded in record ranges on this many worker processes. Off by default:
+# shipping the decoded columns back from the workers takes longer than decoding them in one process
+PARALLEL_TABLES = ['facturad', 'pedidod', 'creditod', 'existe']
+ERP_PARSE_PROCESSES = int(os.getenv("ERP_PARSE_PROCESSES", "1"))
+# Smaller tables decode faster in a single process than it takes to ship their columns back
+ERP_PARALLEL_MIN_RECORDS = int(os.getenv("ERP_PARALLEL_MIN_RECORDS", "200000"))
+
+# Records per batch when billing and sales orders are aggregated out of core,
+# one batch of invoice/order details in memory at a time. 0 loads the whole tables
+ERP_CHUNK_RECORDS = int(os.getenv("ERP_CHUNK_RECORDS", "0"))
+
+# Threads used to load the ERP tables at app start
+ERP_PRELOAD_WORKERS = int(os.getenv("ERP_PRELOAD_WORKERS", "8"))
+
+# Tables that only grow by appending records. Their cached copy is synced by downloading just the new records
+APPEND_ONLY_TABLES = ['facturac', 'facturad', 'pedidoc', 'pedidod', 'ordproc']
+# Edits to older records of those tables are only seen by a full download, forced at least this often
+ERP_FULL_SYNC_HOURS = float(os.getenv("ERP_FULL_SYNC_HOURS", "24"))
+
+# Loaded tables are checked for a new version in the background every this many seconds,
+# set it to 0 to keep them as first loaded
+ERP_REFRESH_SECONDS = int(os.getenv("ERP_REFRESH_SECONDS", "600"))
+# Catalogs rarely change, invoice and order details and stocks often
+TABLE_REFRESH_SECONDS = {
+    'agentes': 6 * 3600,
+    'provedor': 6 * 3600,
+    'clientes': 3600,
+    'producto': 3600,
+    'facturac': 300,
+    'pedidoc': 300,
+    'facturad': 120,
+    'pedidod': 120,
+    'existe': 120,
+}
+
+# A local or mounted SAI directory is watched instead: a changed .dbf is reloaded once its
+# writes stop for ERP_WATCH_DEBOUNCE seconds. Shares that don't report changes need polling
+ERP_WATCH = os.getenv("ERP_WATCH", "1") == "1"
+ERP_WATCH_DEBOUNCE = float(os.getenv("ERP_WATCH_DEBOUNCE", "2"))
+ERP_WATCH_POLLING = os.getenv("ERP_WATCH_POLLING", "0") == "1"
+
 # ... (Previous constants logic is unchanged, I need to match the hunk correctly)
 # I will try to target a smaller chunk.
 
@@ -63,6 +132,10 @@ MP_BUSINESS_UNITS = {
     'PET': ['PET']
 }
 
+# Business unit of every class (and MP subclass), classes not listed are 'OTROS'
+CLASS_BUSINESS_UNITS = {cls: unit for unit, classes in BUSINESS_UNITS.items() for cls in classes}
+MP_CLASS_BUSINESS_UNITS = {cls: unit for unit, classes in MP_BUSINESS_UNITS.items() for cls in classes}
+
 AGENTS_TO_FILTER = [9999, 16, 9998, 9997, 2, 3, 4, 5, 6, 8, 12, 13, 14, 16, 17, 18, 20, 21, 23, 24, 25, 27, 28, 29, 30, 31]
 
 
@@ -73,16 +146,10 @@ def get_table_conn(table_name: str) -> str:
 
 
 def get_business_unit(searched_item: str) -> str | None:
-    for key, value in BUSINESS_UNITS.items():
-        if searched_item in value:
-            return key
-    return 'OTROS'
+    return CLASS_BUSINESS_UNITS.get(searched_item, 'OTROS')
 
 def get_mp_business_unit(searched_item: str) -> str | None:
-    for key, value in MP_BUSINESS_UNITS.items():
-        if searched_item in value:
-            return key
-    return 'OTROS'
+    return MP_CLASS_BUSINESS_UNITS.get(searched_item, 'OTROS')
 
 def get_past_month(curr_month : str, curr_year):
     try:
@@ -95,12 +162,12 @@ def get_past_month(curr_month : str, curr_year):
         return MONTH_NAMES[-1], str(int(curr_year) - 1)
 
 def get_agents_dict(agents_df: pd.DataFrame) -> Dict[str, int]:
-    agents_df.drop(AGENTS_TO_FILTER, inplace=True, errors='ignore')
+    agents_df = agents_df.drop(AGENTS_TO_FILTER, errors='ignore')
     agentsDict = agents_df.reset_index().set_index('NOM_AGE')['CVE_AGE'].to_dict()
     return agentsDict
 
 def get_agents_filtered_list_ids(agents_df: pd.DataFrame, agents_names: list[str] | None) -> list[str]:
-    agents_df.drop(AGENTS_TO_FILTER, inplace=True, errors='ignore')
+    agents_df = agents_df.drop(AGENTS_TO_FILTER, errors='ignore')
     agents_dict = agents_df.reset_index().set_index('NOM_AGE')['CVE_AGE'].to_dict()
     agents_to_filter = [agents_dict[agent_name] for agent_name in agents_names]
 
@@ -1,9 +1,8 @@
-import streamlit as st
-
 from ..utils.data_loader import load_dbf
+from ..utils.frame_cache import shared_frame
 
 # Get agents dataframe
-@st.cache_data 
+@shared_frame
 def get_agents_df(just_name: bool = False):
     agents = load_dbf('agentes', columns=['NOM_AGE', 'FALTA_AGE', 'AREA_AGE', 'EMAIL_AGE'], index=['CVE_AGE'])
 
@@ -0,0 +1,27 @@
+""" BUSINESS UNIT COLUMNS
+
+    The business unit of every row is materialized once by the loaders, as a
+    categorical of the shared 'BU' domain, so grouping or filtering by unit is
+    a column read instead of a lookup per row. With a categorical class column
+    only its categories are looked up and the rows take the unit of their code.
+"""
+import pandas as pd
+
+from ..config import BUSINESS_UNITS, MP_BUSINESS_UNITS, CLASS_BUSINESS_UNITS
+from .categories import shared_dtype
+
+DEFAULT_UNIT = 'OTROS'
+
+
+def business_units(classes: pd.Series, units: dict = CLASS_BUSINESS_UNITS) -> pd.Series:
+    """Business unit of every class in classes, DEFAULT_UNIT for classes not in units"""
+    dtype = shared_dtype('BU', list(BUSINESS_UNITS) + list(MP_BUSINESS_UNITS) + [DEFAULT_UNIT])
+
+    if not isinstance(classes.dtype, pd.CategoricalDtype):
+        return classes.map(units).fillna(DEFAULT_UNIT).astype(dtype)
+
+    # Unit code of every category, plus the one of missing values (code -1)
+    categories = list(classes.cat.categories) + [None]
+    unit_codes = dtype.categories.get_indexer([units.get(cls, DEFAULT_UNIT) for cls in categories])
+    codes = unit_codes[classes.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype), index=classes.index)
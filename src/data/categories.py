@@ -0,0 +1,45 @@
+""" SHARED CATEGORIES OF ERP CODES
+
+    Low cardinality codes (product classes, statuses, units, places, ...) are
+    stored as categoricals. Every column of the same domain, in any table, is
+    encoded with the same process-wide category set, so filters, joins and
+    groupbys between tables work on the integer codes.
+
+    A domain's categories are the sorted union of every value seen so far, so
+    sorting and grouping give the same order as with plain strings. Sets only
+    grow: a frame loaded before a new code appeared keeps the smaller set and
+    pandas combines it with newer frames as plain values.
+"""
+import threading
+import pandas as pd
+
+from typing import Iterable, NamedTuple
+
+_lock = threading.Lock()
+_dtypes: dict[str, pd.CategoricalDtype] = {}
+
+
+class Category(NamedTuple):
+    """Schema dtype of a column encoded with the shared categories of domain"""
+    domain: str
+
+
+def shared_dtype(domain: str, values: Iterable = ()) -> pd.CategoricalDtype:
+    """Categories of domain, adding the values not seen before"""
+    # Strings as object, whole numbers (e.g. CVE_MON) as int64
+    values = pd.Index(list(values), dtype=object).dropna().unique().infer_objects()
+    with _lock:
+        dtype = _dtypes.get(domain)
+        if dtype is None or not values.isin(dtype.categories).all():
+            # A domain first seen in an empty table has no categories yet
+            categories = values if dtype is None or dtype.categories.empty else dtype.categories.append(values).unique()
+            dtype = pd.CategoricalDtype(categories.sort_values())
+            _dtypes[domain] = dtype
+    return dtype
+
+
+def categorize(column: pd.Series, domain: str, extra: Iterable = ()) -> pd.Series:
+    """column encoded with the shared categories of domain, which will also include extra"""
+    values = column.cat.categories if isinstance(column.dtype, pd.CategoricalDtype) else column.unique()
+    return column.astype(shared_dtype(domain, list(values) + list(extra)))
+
@@ -1,8 +1,7 @@
-import streamlit as st
-
 from ..utils.data_loader import load_dbf
+from ..utils.frame_cache import shared_frame
 
 # Get clients dataframe
-@st.cache_data 
+@shared_frame
 def get_clients_df():
     return load_dbf('clientes', columns=['NOM_CTE'], index=['CVE_CTE'])
\ No newline at end of file
@@ -1,14 +1,40 @@
 import numpy as np
 import pandas as pd
-import streamlit as st 
 
-from ..utils.data_loader import load_dbf
-from ..utils.calc import get_bill_class
+from typing import Iterator
+
+from ..utils.data_loader import load_dbf, iter_dbf
+from ..utils.frame_cache import shared_frame
+from ..utils.snapshots import load_snapshot
+from .schemas import apply_schema
+from .facturas import get_bill_classes
+
+DETAIL_COLUMNS = [
+    'CVE_PROD',
+    'MEDIDA',
+    'CANTIDAD',
+    'VALOR_PROD',
+    'TOT',
+    'UNIDAD', 
+    'NEWMED',
+]
 
 #get returns and discounts from database 
-@st.cache_data
-def get_credits_df() -> pd.DataFrame:
-    
+@shared_frame
+def get_credits_df(start_date=None, end_date=None) -> pd.DataFrame:
+    if start_date is not None:
+        # Only the snapshot partitions of the months from start_date to end_date are read
+        return load_snapshot('creditos', ['creditos', 'creditod'], 'FECHA',
+                             get_credits_df.uncached, start_date, end_date)
+
+    credit_details = load_dbf('creditod', columns=DETAIL_COLUMNS, index=['NO_NOTA'])
+
+    credits = _load_credit_notes().join(credit_details, how='left')
+
+    return _set_amounts(credits)
+
+
+def _load_credit_notes() -> pd.DataFrame:
     credit_notes = load_dbf('creditos', columns=[
         'CVE_DDA',
         'TIP_NOT',
@@ -26,27 +52,39 @@ def get_credits_df() -> pd.DataFrame:
         'MES',
         'AÑO',
     ], 
-    index='NO_NOTA')
-
-    credit_details = load_dbf('creditod', columns=[
-        'CVE_PROD',
-        'MEDIDA',
-        'CANTIDAD',
-        'VALOR_PROD',
-        'TOT',
-        'UNIDAD', 
-        'NEWMED',
-    ], 
-    index=['NO_NOTA'])
-
+    index='NO_NOTA',
     # Filtrar anticipos sin factura 
-    credits = credit_notes[(credit_notes['CVE_DDA'].isin(['D', 'N'])) & (credit_notes['NO_ESTADO'] != 'Cancelada')].copy()
-    credits['FACT_ID'] = credits['CVE_FACTU'] + credits['NO_FAC']
+    filters=[
+        ('CVE_DDA', 'in', ['D', 'N']),
+        ('NO_ESTADO', '!=', 'Cancelada'),
+    ])
 
-    credits = credits.join(credit_details, how='left')
+    credit_notes['FACT_ID'] = credit_notes['CVE_FACTU'] + credit_notes['NO_FAC']
+    return credit_notes
+
+
+def _set_amounts(credits: pd.DataFrame) -> pd.DataFrame:
+    # Amount in MN: returns are valued by their products, other notes by their subtotal
+    amount = np.where(credits['TIP_NOT'] == 'Dev. Just.', credits['TOT'], credits['SUBTOTAL'])
+    credits['SUBT_MN'] = amount * np.where(credits['CVE_MON'] != 1, credits['TIP_CAM'], 1)
 
     return credits
 
+
+def iter_credits_df() -> Iterator[pd.DataFrame]:
+    """get_credits_df() in batches of ERP_CHUNK_RECORDS credit details"""
+    credit_notes = _load_credit_notes()
+
+    has_details = np.zeros(len(credit_notes), dtype=bool)
+    for credit_details in iter_dbf('creditod', columns=DETAIL_COLUMNS, index=['NO_NOTA']):
+        has_details |= credit_notes.index.isin(credit_details.index)
+        yield _set_amounts(credit_notes.join(credit_details, how='inner'))
+
+    # The left join also keeps notes without details
+    empty = apply_schema(pd.DataFrame(columns=DETAIL_COLUMNS, index=pd.Index([], name='NO_NOTA')), 'creditod')
+    yield _set_amounts(credit_notes[~has_details].join(empty, how='left'))
+
+
 # In this function you get the returns of Kilograms and amount
 def get_returns_df(credits_df_with_details: pd.DataFrame, products_df: pd.DataFrame) -> pd.DataFrame:
 
@@ -65,10 +103,17 @@ def get_returns_df(credits_df_with_details: pd.DataFrame, products_df: pd.DataFr
     return returns_df[['FECHA', 'NO_CLIENTE', 'NO_ESTADO', 'FACT_ID', 'CVE_PROD', 'CANTIDAD', 'UNIDAD', 'CSE_PROD', 'PESO_TOTAL_DEV', 'DEVOLUCION_MN', 'DESC_NOTA']]
 
 
-def get_discounts_df(credits_df: pd.DataFrame, facturas_with_details_df: pd.DataFrame) -> pd.DataFrame:
+def get_credit_bill_classes(fact_ids: pd.Series) -> pd.Series:
+    """Class of the bill of every credit note, OTRO for notes without bill"""
+    bill_classes = get_bill_classes()['CSE_PROD']
+    classes = fact_ids.map(bill_classes).astype(object)
+    return classes.where(fact_ids != '', 'OTRO')
+
+
+def get_discounts_df(credits_df: pd.DataFrame) -> pd.DataFrame:
 
     discounts = credits_df[(credits_df['TIP_NOT'] == 'Descuento') | (credits_df['CVE_PROD'] == 'OTRO-40')].copy()
-    discounts['CSE_PROD'] = discounts['FACT_ID'].apply(lambda x: get_bill_class(x, facturas_with_details_df))
+    discounts['CSE_PROD'] = get_credit_bill_classes(discounts['FACT_ID'])
 
     # Classify if it is a discount caused by quality or an application of an advance payment
     discounts['CSE_DESCUENTO'] = np.where(discounts['CVE_PROD'] == 'OTRO-40', 'APLICACION ANTICIPO', 'DESCUENTO')
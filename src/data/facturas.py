@@ -1,12 +1,38 @@
+import logging
 import pandas as pd
-import streamlit as st
 
-from ..utils.data_loader import load_dbf
+from typing import Iterator
+
+from ..utils.data_loader import load_dbf, iter_dbf, join_details
+from ..utils.frame_cache import shared_frame
+from ..utils.snapshots import load_snapshot
+from .business_units import business_units
+
+logger = logging.getLogger(__name__)
+
+DETAIL_COLUMNS = [
+    'CVE_FACTU',
+    'NO_FAC',
+    'CSE_PROD',
+    'CVE_PROD',
+    'VALOR_PROD',
+    'CANT_SURT',
+    'SUBT_PROD',
+    'DESCU_PROD',
+]
 
 
 # Get invoices data frames
-@st.cache_data 
-def get_facturas_df(with_details: bool = True):
+@shared_frame
+def get_facturas_df(with_details: bool = True, start_date=None, end_date=None):
+    if start_date is not None:
+        # Only the snapshot partitions of the months from start_date to end_date are read
+        return load_snapshot('facturas_detalle' if with_details else 'facturas',
+                             ['facturac', 'facturad'] if with_details else ['facturac'],
+                             'FALTA_FAC',
+                             lambda: get_facturas_df.uncached(with_details),
+                             start_date, end_date)
+
     facturas = load_dbf('facturac', columns=[
         'CVE_FACTU',
         'NO_FAC',
@@ -25,6 +51,10 @@ def get_facturas_df(with_details: bool = True):
         'SALDO_FAC2',
         'MES',
         'AÑO',
+    ], filters=[
+        # Delete "Cancelada" bills and traspaso de materiales
+        ('STATUS_FAC', '!=', 'Cancelada'),
+        ('CVE_AGE', '!=', 9999),
     ])
 
     # Create indexes based on code and and number 
@@ -34,41 +64,57 @@ def get_facturas_df(with_details: bool = True):
     facturas.drop(['CVE_FACTU', 'NO_FAC'], axis=1, inplace=True)
 
     if with_details:
-        facturasD = load_dbf('facturad', columns=[
-            'CVE_FACTU',
-            'NO_FAC',
-            'CSE_PROD',
-            'CVE_PROD',
-            'VALOR_PROD',
-            'CANT_SURT',
-            'SUBT_PROD',
-            'DESCU_PROD',
-        ])
+        facturasD = load_dbf('facturad', columns=DETAIL_COLUMNS)
         
-        # Create indexes based on code and and number 
-        facturasD['FACT_ID'] = facturasD['CVE_FACTU'] + facturasD['NO_FAC']
-        facturasD.set_index('FACT_ID', inplace=True)
-        # Drop columns not needed
-        facturasD.drop(['CVE_FACTU', 'NO_FAC'], axis=1, inplace=True)
-
-        # Join dataframes in one 
-        facts = facturasD.join(facturas)
+        # Join dataframes in one, details of filtered bills are dropped
+        facts = join_details(_index_details(facturasD), facturas, _bill_ids())
     
     else: 
         facts = facturas
 
-    # Delete "Cancelada" bills
-    facts.drop(facts[facts['STATUS_FAC'] == 'Cancelada'].index, inplace=True)
+    return facts
 
-    # Transform date columns of obj to datetime col
-    facts['FALTA_FAC'] = pd.to_datetime(facts['FALTA_FAC'])
-    facts['F_PAGO'] = pd.to_datetime(facts['F_PAGO'])
 
-    # Delete traspaso de materiales 
-    facts.drop(facts[facts['CVE_AGE'] == 9999].index, inplace=True)
+def _bill_ids() -> pd.Index:
+    """FACT_ID of every bill, filtered or not"""
+    bills = load_dbf('facturac', columns=['CVE_FACTU', 'NO_FAC'])
+    return pd.Index(bills['CVE_FACTU'] + bills['NO_FAC'])
 
-    return facts
+
+def _index_details(facturasD: pd.DataFrame) -> pd.DataFrame:
+    # Create indexes based on code and and number 
+    facturasD['FACT_ID'] = facturasD['CVE_FACTU'] + facturasD['NO_FAC']
+    facturasD.set_index('FACT_ID', inplace=True)
+    # Drop columns not needed
+    facturasD.drop(['CVE_FACTU', 'NO_FAC'], axis=1, inplace=True)
+    facturasD['BU'] = business_units(facturasD['CSE_PROD'])
+    return facturasD
+
+
+def iter_facturas_df(start_date=None, end_date=None) -> Iterator[pd.DataFrame]:
+    """get_facturas_df() in batches of ERP_CHUNK_RECORDS invoice details, joined with their bills.
+    With start_date and end_date only bills of those months are joined. Not cached"""
+    facturas = get_facturas_df.uncached(with_details=False, start_date=start_date, end_date=end_date)
+    # Details of bills of other months aren't joined either
+    bill_ids = _bill_ids() if start_date is None else None
+
+    for facturasD in iter_dbf('facturad', columns=DETAIL_COLUMNS):
+        yield join_details(_index_details(facturasD), facturas, bill_ids)
 
 
+@shared_frame
+def get_bill_classes() -> pd.DataFrame:
+    """Class of every bill (CSE_PROD), the class of its first product, and how many
+    classes its products have (N_CLASES), indexed by FACT_ID"""
+    # Distinct classes of every bill, in the order of its products
+    pairs = [df['CSE_PROD'].reset_index().drop_duplicates() for df in iter_facturas_df()]
+    pairs = pd.concat(pairs).drop_duplicates() if pairs else pd.DataFrame(columns=['FACT_ID', 'CSE_PROD'])
 
+    classes = pairs.drop_duplicates('FACT_ID').set_index('FACT_ID')
+    classes['N_CLASES'] = pairs['FACT_ID'].value_counts()
 
+    mixed = classes.index[classes['N_CLASES'] > 1]
+    if len(mixed):
+        logger.warning('%d bills have products of more than one class, they take the class of their first product: %s',
+                       len(mixed), ', '.join(mixed[:10]))
+    return classes
@@ -1,9 +1,9 @@
 import pandas as pd 
-import streamlit as st
 
-from ..utils.data_loader import load_dbf
+from ..utils.data_loader import load_dbf, join_details
+from ..utils.frame_cache import shared_frame
 
-@st.cache_data 
+@shared_frame
 def oc_facs(with_details: bool = True) -> pd.DataFrame: 
     oc_fac = load_dbf('comprafc', columns=[
         'NO_FACC',
@@ -15,7 +15,7 @@ def oc_facs(with_details: bool = True) -> pd.DataFrame:
         'TIP_CAM',
         'SALDO_FAC2',
         'FECH_VENCI',
-    ], index='NO_FACC')
+    ], index='NO_FACC', filters=[('STATUS_FAC', '!=', 'Cancelada')])
 
     oc_facd = load_dbf('comprafd', columns=[
         'NO_FACC', 
@@ -30,11 +30,11 @@ def oc_facs(with_details: bool = True) -> pd.DataFrame:
     ], index='NO_FACC')
 
     if with_details:
-        df = oc_facd.join(oc_fac, how='left')
+        # Details of cancelled bills are dropped
+        df = join_details(oc_facd, oc_fac, load_dbf('comprafc', columns=['STATUS_FAC'], index='NO_FACC').index)
     else: 
         df = oc_fac
 
-    df = df[df['STATUS'] != 'Cancelada']
     return df
 
 
@@ -0,0 +1,94 @@
+""" PRELOAD OF ERP TABLES AT APP START
+
+    Fills the caches of every table used by src/data with a bounded thread
+    pool instead of lazily, one table after another, from whichever view runs first.
+    Remote tables are first synced to the on-disk cache all at once, then the
+    loaders decode them concurrently.
+
+    Tables with history are only loaded for the months the app opens on, which
+    also writes their Parquet snapshots. The full history is left to the views
+    that ask for it.
+"""
+import logging
+import threading
+import streamlit as st
+
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from ..config import ERP_PRELOAD_WORKERS, ERP_CACHE_DIR, YEAR_OPTIONS, YEAR_INDEX, get_table_conn
+from ..utils.table_cache import sync_table
+from ..utils.dates_calculator import range_of_months_to_dates
+
+from .agents import get_agents_df
+from .clientes import get_clients_df
+from .credits import get_credits_df
+from .facturas import get_facturas_df
+from .productos import get_products_df
+from .purchase_orders import get_pos
+from .resultados_prod import get_res_ops_df
+from .sales_orders import get_sales_orders
+from .stocks import get_existencias
+from .suppliers import get_suppliers
+
+logger = logging.getLogger(__name__)
+
+PRELOAD_TABLES = [
+    'facturac', 'facturad', 'pedidoc', 'pedidod', 'creditos', 'creditod', 'comprapc', 'comprapd',
+    'existe', 'ordproc', 'producto', 'agentes', 'clientes', 'provedor',
+]
+
+
+def preload_loaders() -> list[tuple]:
+    """Loaders called the same way the views call them for the default month and year, so their cache entries are reused"""
+    month, year = f'{datetime.now().month:02d}', YEAR_OPTIONS[YEAR_INDEX]
+    start_date, end_date = range_of_months_to_dates(month, year, 1)
+    # Open orders are looked up within the last 6 delivery months
+    orders_start, _ = range_of_months_to_dates(month, year, 6)
+    # The Facturación page compares with the past month
+    bills_start, _ = range_of_months_to_dates(month, year, 2)
+
+    return [
+        (get_facturas_df, {'with_details': True, 'start_date': start_date, 'end_date': end_date}),
+        (get_facturas_df, {'with_details': True, 'start_date': bills_start, 'end_date': end_date}),
+        (get_credits_df, {'start_date': start_date, 'end_date': end_date}),
+        (get_sales_orders, {'with_details': True, 'start_date': start_date, 'end_date': end_date}),
+        (get_sales_orders, {'with_details': True, 'start_date': orders_start, 'end_date': end_date}),
+        (get_res_ops_df, {'start_date': start_date, 'end_date': end_date}),
+        (get_pos, {}),
+        (get_existencias, {}),
+        (get_products_df, {}),
+        (get_agents_df, {}),
+        (get_agents_df, {'just_name': True}),
+        (get_clients_df, {}),
+        (get_suppliers, {}),
+    ]
+
+
+def _run(task, *args, **kwargs):
+    # A failed table is loaded again, and reported, by the view that needs it
+    try:
+        task(*args, **kwargs)
+    except Exception as e:
+        logger.warning('Preload of %s failed: %s', getattr(task, '__name__', task), e)
+
+
+@st.cache_resource(show_spinner='Cargando tablas del ERP...')
+def preload_tables() -> None:
+    """Load every ERP table concurrently, once per server process"""
+    ctx = get_script_run_ctx()
+
+    def attach_ctx():
+        # Workers may report errors with st.error on the page that started the preload
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+
+    with ThreadPoolExecutor(max_workers=ERP_PRELOAD_WORKERS, initializer=attach_ctx,
+                            thread_name_prefix='erp-preload') as pool:
+        if ERP_CACHE_DIR:
+            remote = [(table, get_table_conn(table)) for table in PRELOAD_TABLES]
+            remote = [(table, url) for table, url in remote if url.startswith('http')]
+            list(pool.map(lambda args: _run(sync_table, *args), remote))
+
+        list(pool.map(lambda loader: _run(loader[0], **loader[1]), preload_loaders()))
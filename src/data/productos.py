@@ -1,15 +1,21 @@
-import streamlit as st
-
 from ..utils.data_loader import load_dbf
+from ..utils.frame_cache import shared_frame
+from ..config import MP_CLASS_BUSINESS_UNITS
+from .business_units import business_units
 
 # Get clients dataframe
-@st.cache_data 
+@shared_frame
 def get_products_df():
-    return load_dbf('producto', columns=[
+    products = load_dbf('producto', columns=[
     'CSE_PROD',
     'DESC_PROD',
     'FACT_PESO',
     'UNI_MED',
     'SUB_CSE',
     'SUB_SUBCSE'
-    ], index=['CVE_PROD'])
\ No newline at end of file
+    ], index=['CVE_PROD'])
+
+    # Unit of the finished products by class, of raw materials by subclass
+    products['BU'] = business_units(products['CSE_PROD'])
+    products['BU_MP'] = business_units(products['SUB_SUBCSE'], MP_CLASS_BUSINESS_UNITS)
+    return products
\ No newline at end of file
@@ -1,10 +1,21 @@
 import pandas as pd 
-import streamlit as st
 
-from ..utils.data_loader import load_dbf
+from ..utils.data_loader import load_dbf, join_details
+from ..utils.frame_cache import shared_frame
+from ..utils.snapshots import load_snapshot
+
+@shared_frame
+def get_pos(with_details: bool = True, start_date=None, end_date=None, open_orders: bool = False) -> pd.DataFrame:
+    """Purchase orders, with start_date and end_date only those delivered in those months.
+    open_orders adds the orders not supplied yet whatever their date"""
+    if start_date is not None or open_orders:
+        return load_snapshot('compras_detalle' if with_details else 'compras',
+                             ['comprapc', 'comprapd'] if with_details else ['comprapc'],
+                             'FECH_ENT',
+                             lambda: get_pos.uncached(with_details),
+                             start_date, end_date,
+                             include=('STATUS', '!=', 'Surtido') if open_orders else None)
 
-@st.cache_data
-def get_pos(with_details: bool = True) -> pd.DataFrame:
     # po table 
     po = load_dbf('comprapc', columns=[
         'F_ALTA_PED',
@@ -18,7 +29,7 @@ def get_pos(with_details: bool = True) -> pd.DataFrame:
         'AÑO',
         'LUGAR',
         'STATUS_AUT',
-    ], index='NO_PEDC')
+    ], index='NO_PEDC', filters=[('STATUS', '!=', 'Cancelado')])
 
     # po details 
     pod = load_dbf('comprapd', columns=[
@@ -34,13 +45,10 @@ def get_pos(with_details: bool = True) -> pd.DataFrame:
         'NEW_MED',
     ], index='NO_PEDC')
 
-    po['FECH_ENT'] = pd.to_datetime(po['FECH_ENT'], errors='coerce')
-
     if with_details:
-        df = pod.join(po, how='left')
+        # Details of cancelled orders are dropped
+        df = join_details(pod, po, load_dbf('comprapc', columns=['STATUS'], index='NO_PEDC').index)
     else:
         df = po
 
-    df = df[df['STATUS'] != 'Cancelado']
-
     return df
\ No newline at end of file
@@ -0,0 +1,102 @@
+""" BACKGROUND REFRESH OF ERP TABLES
+
+    A daemon thread checks every loaded table, and every table read through its
+    Parquet snapshots, for a new version on its own schedule
+    (TABLE_REFRESH_SECONDS) and decodes it in the background. Readers keep
+    getting the last good version meanwhile, and also when the refresh fails.
+    Once a new version is swapped in, the cached loaders built from the table
+    are cleared and the ones preloaded at app start are built again.
+"""
+import time
+import logging
+import threading
+import streamlit as st
+
+from ..config import ERP_REFRESH_SECONDS, TABLE_REFRESH_SECONDS
+from ..utils.table_store import loaded_tables, refresh_table
+
+from .agents import get_agents_df
+from .clientes import get_clients_df
+from .credits import get_credits_df
+from .facturas import get_facturas_df, get_bill_classes
+from .oc_facs import oc_facs
+from .productos import get_products_df
+from .purchase_orders import get_pos
+from .resultados_prod import get_res_ops_df
+from .sales_orders import get_sales_orders
+from .stocks import get_existencias
+from .suppliers import get_suppliers
+from .preload import preload_loaders
+from ..domain.sales_cube import get_sales_cube
+
+logger = logging.getLogger(__name__)
+
+# Cached loaders built from each table
+TABLE_LOADERS = {
+    'facturac': [get_facturas_df, get_bill_classes, get_sales_cube],
+    'facturad': [get_facturas_df, get_bill_classes, get_sales_cube],
+    'pedidoc': [get_sales_orders, get_sales_cube],
+    'pedidod': [get_sales_orders, get_sales_cube],
+    'creditos': [get_credits_df, get_sales_cube],
+    'creditod': [get_credits_df, get_sales_cube],
+    'comprapc': [get_pos],
+    'comprapd': [get_pos],
+    'comprafc': [oc_facs],
+    'comprafd': [oc_facs],
+    'existe': [get_existencias],
+    'ordproc': [get_res_ops_df],
+    'producto': [get_products_df, get_sales_cube],
+    'agentes': [get_agents_df],
+    'clientes': [get_clients_df, get_sales_cube],
+    'provedor': [get_suppliers],
+}
+
+# Seconds between passes over the loaded tables
+TICK_SECONDS = 5
+
+
+def refresh(table_name: str, max_age: float = 0) -> bool:
+    """Swap in a new version of table_name if it changed and rebuild its loaders"""
+    try:
+        # Other processes sharing ERP_SHARED_DIR may have checked it in the last max_age seconds
+        if not refresh_table(table_name, max_age):
+            return False
+    except Exception as e:
+        logger.warning('Refresh of %s failed, keeping the loaded version: %s', table_name, e)
+        return False
+
+    loaders = TABLE_LOADERS.get(table_name, [])
+    for loader in loaders:
+        loader.clear()
+
+    # Built now instead of by the next page that needs them
+    for loader, kwargs in preload_loaders():
+        if loader in loaders:
+            try:
+                loader(**kwargs)
+            except Exception as e:
+                logger.warning('Rebuild of %s failed: %s', loader.__name__, e)
+    return True
+
+
+def _run() -> None:
+    next_refresh: dict[str, float] = {}
+    while True:
+        for table_name in loaded_tables():
+            interval = TABLE_REFRESH_SECONDS.get(table_name, ERP_REFRESH_SECONDS)
+            due = next_refresh.setdefault(table_name, time.monotonic() + interval)
+            if time.monotonic() >= due:
+                refresh(table_name, interval)
+                next_refresh[table_name] = time.monotonic() + interval
+        time.sleep(TICK_SECONDS)
+
+
+@st.cache_resource
+def start_refresher() -> threading.Thread | None:
+    """Start the refresher thread, once per server process"""
+    if not ERP_REFRESH_SECONDS:
+        return None
+
+    thread = threading.Thread(target=_run, name='erp-refresher', daemon=True)
+    thread.start()
+    return thread
@@ -1,10 +1,16 @@
 import pandas as pd
-import streamlit as st
 
 from ..utils.data_loader import load_dbf
+from ..utils.frame_cache import shared_frame
+from ..utils.snapshots import load_snapshot
+
+@shared_frame
+def get_res_ops_df(start_date=None, end_date=None):
+    if start_date is not None:
+        # Only the snapshot partitions of the months from start_date to end_date are read
+        return load_snapshot('ordproc', ['ordproc'], 'FECH_ORDP',
+                             get_res_ops_df.uncached, start_date, end_date)
 
-@st.cache_data
-def get_res_ops_df():
     results = load_dbf('ordproc', columns=[
         'NO_ORDP',
         'FECH_ORDP',
@@ -16,12 +22,6 @@ def get_res_ops_df():
         'DATOEST4',
         'NEW_COPR',
         'UNCRES'
-    ])
-
-    # DROP RESULTS CANCELED
-    results.drop(results[results['STATUS'] == 'Cancelada'].index, inplace=True)
-
-    # Make fech_ordp a datetime column
-    results['FECH_ORDP'] = pd.to_datetime(results['FECH_ORDP'])
+    ], filters=[('STATUS', '!=', 'Cancelada')])
 
     return results
\ No newline at end of file
@@ -1,14 +1,57 @@
 import numpy as np
 import pandas as pd
-import streamlit as st
 
-from ..utils.data_loader import load_dbf
+from typing import Iterator
+
+from ..utils.data_loader import load_dbf, iter_dbf
+from ..utils.frame_cache import shared_frame
+from ..utils.snapshots import load_snapshot
+from .schemas import apply_schema
+from .business_units import business_units
+
+DETAIL_COLUMNS = [
+    'CVE_PROD',
+    'CSE_PROD',
+    'CANT_PROD',
+    'VALOR_PROD',
+    'FECHA_ENT', 
+    'STATUS1',
+    'SALDO',
+    'UNIDAD',
+    'NEW_MED',
+    'STAT_PRO',
+]
 
 # Get sales orders dataframe 
-@st.cache_data
-def get_sales_orders(with_details: bool = True) -> pd.DataFrame:
+@shared_frame
+def get_sales_orders(with_details: bool = True, start_date=None, end_date=None) -> pd.DataFrame:
+    if start_date is not None:
+        # Only the snapshot partitions of the delivery months from start_date to end_date are read
+        return load_snapshot('pedidos_detalle' if with_details else 'pedidos',
+                             ['pedidoc', 'pedidod'] if with_details else ['pedidoc'],
+                             'FECHA_ENT',
+                             lambda: get_sales_orders.uncached(with_details),
+                             start_date, end_date)
     
-    orders = load_dbf('pedidoc', columns=[
+    orders = _load_orders()
+
+    if (not with_details):
+        return orders
+
+    ordersD = load_dbf('pedidod', columns=DETAIL_COLUMNS, index='NO_PED')
+
+    # In database, there are times when FECHA_ENT can be NONE
+    orders.rename(columns={
+        'FECHA_ENT': 'FECHA_ENT_MAIN'
+    }, inplace=True)
+
+    orders = orders.join(ordersD, how='left')
+
+    return _set_derived_columns(orders)
+
+
+def _load_orders() -> pd.DataFrame:
+    return load_dbf('pedidoc', columns=[
         'CVE_CTE',
         'CVE_AGE',
         'F_ALTA_PED', 
@@ -22,39 +65,28 @@ def get_sales_orders(with_details: bool = True) -> pd.DataFrame:
         'FECHA_ENT',
         'STATUS2',
         'PESOTOT',
-    ], index=['NO_PED'])
+    ], index=['NO_PED'], filters=[('STATUS', '!=', 'Cancelado')])
 
-    orders = orders[orders['STATUS'] != 'Cancelado']
 
-    if (not with_details):
-        cols = ['F_ALTA_PED', 'FECHA_ENT']
-        orders[cols] = orders[cols].apply(pd.to_datetime, format='%Y%m%d')
-
-        return orders
+def _set_derived_columns(orders: pd.DataFrame) -> pd.DataFrame:
+    orders['FECHA_ENT'] = orders['FECHA_ENT'].fillna(orders['FECHA_ENT_MAIN'])
+    # Orders without details are 'OTROS' too
+    orders['BU'] = business_units(orders['CSE_PROD'])
+    return orders
 
-    ordersD = load_dbf('pedidod', columns=[
-        'CVE_PROD',
-        'CSE_PROD',
-        'CANT_PROD',
-        'VALOR_PROD',
-        'FECHA_ENT', 
-        'STATUS1',
-        'SALDO',
-        'UNIDAD',
-        'NEW_MED',
-        'STAT_PRO',
-    ], index='NO_PED')
 
-    # In database, there are times when FECHA_ENT can be NONE
+def iter_sales_orders() -> Iterator[pd.DataFrame]:
+    """get_sales_orders() in batches of ERP_CHUNK_RECORDS order details"""
+    orders = _load_orders()
     orders.rename(columns={
         'FECHA_ENT': 'FECHA_ENT_MAIN'
     }, inplace=True)
 
-    orders = orders.join(ordersD, how='left')
-
-    orders['FECHA_ENT'] = orders['FECHA_ENT'].fillna(orders['FECHA_ENT_MAIN'])
-
-    cols = ['F_ALTA_PED', 'FECHA_ENT']
-    orders[cols] = orders[cols].apply(pd.to_datetime, format='%Y%m%d')
+    has_details = np.zeros(len(orders), dtype=bool)
+    for ordersD in iter_dbf('pedidod', columns=DETAIL_COLUMNS, index='NO_PED'):
+        has_details |= orders.index.isin(ordersD.index)
+        yield _set_derived_columns(orders.join(ordersD, how='inner'))
 
-    return orders
\ No newline at end of file
+    # The left join also keeps orders without details
+    empty = apply_schema(pd.DataFrame(columns=DETAIL_COLUMNS, index=pd.Index([], name='NO_PED')), 'pedidod')
+    yield _set_derived_columns(orders[~has_details].join(empty, how='left'))
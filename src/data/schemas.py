@@ -0,0 +1,275 @@
+""" DTYPES OF THE ERP TABLES
+
+    Columns of every SAI table are converted once, when the table is decoded
+    (see src/utils/table_store.py), to the dtypes declared here instead of
+    object / float64. The declared columns are also the ones decoded:
+
+        STRING  Arrow backed strings, for codes, names and descriptions
+        INT     int32 keys and counters
+        FLOAT   float64 for amounts, exchange rates and quantities
+        DATE    datetime64, so loaders and views don't parse dates again
+        Category(domain)
+                categorical with the categories shared by every column of
+                domain, for low cardinality codes (see src/data/categories.py)
+
+    A declared dtype is skipped when the column doesn't hold that kind of data,
+    e.g. whole numbers with empty values or out of the int32 range stay as read.
+"""
+import numpy as np
+import pandas as pd
+
+from .categories import Category, categorize
+
+STRING = pd.StringDtype('pyarrow', na_value=np.nan)
+INT = np.dtype('int32')
+FLOAT = np.dtype('float64')
+DATE = np.dtype('datetime64[ns]')
+
+SCHEMAS = {
+    # Invoices
+    'facturac': {
+        'CVE_FACTU': STRING,
+        'NO_FAC': STRING,
+        'CVE_CTE': STRING,
+        'FALTA_FAC': DATE,
+        'STATUS_FAC': Category('STATUS_FAC'),
+        'CVE_MON': Category('CVE_MON'),
+        'TIP_CAM': FLOAT,
+        'PESOTOT': FLOAT,
+        'CVE_AGE': INT,
+        'F_PAGO': DATE,
+        'SUBT_FAC': FLOAT,
+        'TOTAL_FAC': FLOAT,
+        'DESCUENTO': FLOAT,
+        'SALDO_FAC': FLOAT,
+        'SALDO_FAC2': FLOAT,
+        'MES': STRING,
+        'AÑO': STRING,
+    },
+    'facturad': {
+        'CVE_FACTU': STRING,
+        'NO_FAC': STRING,
+        'CSE_PROD': Category('CSE_PROD'),
+        'CVE_PROD': STRING,
+        'VALOR_PROD': FLOAT,
+        'CANT_SURT': FLOAT,
+        'SUBT_PROD': FLOAT,
+        'DESCU_PROD': FLOAT,
+    },
+
+    # Sales orders
+    'pedidoc': {
+        'NO_PED': STRING,
+        'CVE_CTE': STRING,
+        'CVE_AGE': INT,
+        'F_ALTA_PED': DATE,
+        'STATUS': Category('STATUS'),
+        'SUBT_PED': FLOAT,
+        'OBSERVA': STRING,
+        'CVE_MON': Category('CVE_MON'),
+        'TIP_CAM': FLOAT,
+        'MES': STRING,
+        'AÑO': STRING,
+        'FECHA_ENT': DATE,
+        'STATUS2': STRING,
+        'PESOTOT': FLOAT,
+    },
+    'pedidod': {
+        'NO_PED': STRING,
+        'CVE_PROD': STRING,
+        'CSE_PROD': Category('CSE_PROD'),
+        'CANT_PROD': FLOAT,
+        'VALOR_PROD': FLOAT,
+        'FECHA_ENT': DATE,
+        'STATUS1': Category('STATUS1'),
+        'SALDO': FLOAT,
+        'UNIDAD': Category('UNIDAD'),
+        'NEW_MED': STRING,
+        'STAT_PRO': STRING,
+    },
+
+    # Credit notes
+    'creditos': {
+        'NO_NOTA': INT,
+        'CVE_DDA': STRING,
+        'TIP_NOT': Category('TIP_NOT'),
+        'FECHA': DATE,
+        'DESC_NOTA': STRING,
+        'NO_CLIENTE': STRING,
+        'NO_AGENTE': INT,
+        'NO_ESTADO': STRING,
+        'SUBTOTAL': FLOAT,
+        'SALDO': FLOAT,
+        'CVE_FACTU': STRING,
+        'NO_FAC': STRING,
+        'CVE_MON': Category('CVE_MON'),
+        'TIP_CAM': FLOAT,
+        'MES': STRING,
+        'AÑO': STRING,
+    },
+    'creditod': {
+        'NO_NOTA': INT,
+        'CVE_PROD': STRING,
+        'MEDIDA': STRING,
+        'CANTIDAD': FLOAT,
+        'VALOR_PROD': FLOAT,
+        'TOT': FLOAT,
+        'UNIDAD': Category('UNIDAD'),
+        'NEWMED': STRING,
+    },
+
+    # Purchase orders
+    'comprapc': {
+        'NO_PEDC': STRING,
+        'F_ALTA_PED': DATE,
+        'STATUS': Category('STATUS'),
+        'TOTAL_PED': FLOAT,
+        'SUBT_PED': FLOAT,
+        'FECH_ENT': DATE,
+        'CVE_MON': Category('CVE_MON'),
+        'TIP_CAM': FLOAT,
+        'MES': STRING,
+        'AÑO': STRING,
+        'LUGAR': Category('LUGAR'),
+        'STATUS_AUT': STRING,
+    },
+    'comprapd': {
+        'NO_PEDC': STRING,
+        'CVE_PROD': STRING,
+        'CSE_PROD': Category('CSE_PROD'),
+        'CANT_PROD': FLOAT,
+        'VALOR_PROD': FLOAT,
+        'STATUS1': Category('STATUS1'),
+        'CVE_PROV': STRING,
+        'SALDO': FLOAT,
+        'F_ENT': DATE,
+        'UNIDAD': Category('UNIDAD'),
+        'NEW_MED': STRING,
+    },
+
+    # Supplier invoices
+    'comprafc': {
+        'NO_FACC': STRING,
+        'CVE_PROV': STRING,
+        'STATUS_FAC': Category('STATUS_FAC'),
+        'SALDO_FAC': FLOAT,
+        'LUGAR': Category('LUGAR'),
+        'CVE_MON': Category('CVE_MON'),
+        'TIP_CAM': FLOAT,
+        'SALDO_FAC2': FLOAT,
+        'FECH_VENCI': DATE,
+    },
+    'comprafd': {
+        'NO_FACC': STRING,
+        'CVE_PROV': STRING,
+        'CSE_PRDO': Category('CSE_PROD'),
+        'CVE_PROD': STRING,
+        'CANT_SURT': FLOAT,
+        'VALOR_PROD': FLOAT,
+        'SUBT_PROD': FLOAT,
+        'UNIDAD': Category('UNIDAD'),
+        'NEW_MED': STRING,
+    },
+
+    # Stocks and production
+    'existe': {
+        'CVE_PROD': STRING,
+        'NEW_MED': STRING,
+        'LUGAR': Category('LUGAR'),
+        'EXISTENCIA': FLOAT,
+        'FECH_UMOD': DATE,
+        'LOTE': STRING,
+        'FECH_LOTE': DATE,
+        'COSTO_PROM': FLOAT,
+        'COSTUEPEPS': FLOAT,
+    },
+    'ordproc': {
+        'NO_ORDP': STRING,
+        'FECH_ORDP': DATE,
+        'CVE_COPR': STRING,
+        'REN_COPR': INT,
+        'STATUS': Category('STATUS'),
+        'CTO_UNIT': FLOAT,
+        'NO_OPRO': INT,
+        'DATOEST4': STRING,
+        'NEW_COPR': STRING,
+        'UNCRES': FLOAT,
+    },
+
+    # Catalogs
+    'producto': {
+        'CVE_PROD': STRING,
+        'CSE_PROD': Category('CSE_PROD'),
+        'DESC_PROD': STRING,
+        # Kilograms per unit, float64 so kilogram totals add up as before
+        'FACT_PESO': FLOAT,
+        'UNI_MED': STRING,
+        'SUB_CSE': Category('SUB_CSE'),
+        'SUB_SUBCSE': Category('SUB_SUBCSE'),
+    },
+    'agentes': {
+        'CVE_AGE': INT,
+        'NOM_AGE': STRING,
+        'FALTA_AGE': DATE,
+        'AREA_AGE': STRING,
+        'EMAIL_AGE': STRING,
+    },
+    'clientes': {
+        'CVE_CTE': STRING,
+        'NOM_CTE': STRING,
+    },
+    'provedor': {
+        'CVE_PROV': STRING,
+        'NOM_PROV': STRING,
+    },
+}
+
+# Domain of the categorical columns, by column name
+DOMAINS = {col: dtype.domain for schema in SCHEMAS.values() for col, dtype in schema.items() if isinstance(dtype, Category)}
+# Business units added by the loaders (see src/data/business_units.py)
+DOMAINS.update(BU='BU', BU_MP='BU')
+
+
+def _convert(column: pd.Series, dtype) -> pd.Series:
+    if dtype == DATE:
+        return pd.to_datetime(column, errors='coerce')
+
+    if dtype == STRING:
+        # Only text fields, a numeric code keeps comparing equal to its numbers
+        return column.astype(dtype) if column.dtype == object else column
+
+    if dtype == INT:
+        if column.empty:
+            return column.astype(dtype)
+        # Whole numbers with empty values are read as float, like dbfread does
+        if not pd.api.types.is_integer_dtype(column.dtype):
+            return column
+        info = np.iinfo(dtype)
+        if column.min() < info.min or column.max() > info.max:
+            return column
+        return column.astype(dtype)
+
+    if column.dtype == object or pd.api.types.is_numeric_dtype(column.dtype):
+        return pd.to_numeric(column, errors='coerce').astype(dtype)
+    return column
+
+
+def apply_schema(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
+    """Convert the columns of a table loaded from table_name to their declared dtypes"""
+    schema = SCHEMAS.get(table_name, {})
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        if isinstance(dtype, Category):
+            df[col] = categorize(df[col], dtype.domain)
+        elif df[col].dtype != dtype:
+            df[col] = _convert(df[col], dtype)
+    return df
+
+
+def share_categories(df: pd.DataFrame) -> pd.DataFrame:
+    """Encode the code columns of a loaded frame read back from Parquet with the shared categories"""
+    for col in df.columns:
+        if col in DOMAINS:
+            df[col] = categorize(df[col], DOMAINS[col])
+    return df
@@ -1,9 +1,9 @@
 import pandas as pd 
-import streamlit as st
 
 from ..utils.data_loader import load_dbf
+from ..utils.frame_cache import shared_frame
 
-@st.cache_data
+@shared_frame
 def get_existencias() -> pd.DataFrame:
     df = load_dbf('existe', columns=[
         'CVE_PROD',
@@ -15,8 +15,6 @@ def get_existencias() -> pd.DataFrame:
         'FECH_LOTE',
         'COSTO_PROM',
         'COSTUEPEPS'
-    ])
-
-    df = df[df['EXISTENCIA'] != 0]
+    ], filters=[('EXISTENCIA', '!=', 0)])
 
     return df
\ No newline at end of file
@@ -1,9 +1,9 @@
 import pandas as pd 
-import streamlit as st
 
 from ..utils.data_loader import load_dbf
+from ..utils.frame_cache import shared_frame
 
-@st.cache_data
+@shared_frame
 def get_suppliers() -> pd.DataFrame:
     df = load_dbf('provedor', columns=[
         'NOM_PROV'
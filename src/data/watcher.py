@@ -0,0 +1,82 @@
+""" WATCH OF A LOCAL SAI DIRECTORY
+
+    When ERP_DB_PATH is a local or mounted directory, a watchdog observer gets
+    the changes to its .dbf files (and their memo files) instead of checking
+    every table on a schedule. SAI writes a table in many small writes, so a
+    table is only reloaded once its file has been quiet for ERP_WATCH_DEBOUNCE
+    seconds. Only that table and the cached loaders built from it are reloaded,
+    through the same refresh as the background refresher.
+"""
+import os
+import logging
+import threading
+import streamlit as st
+
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from watchdog.observers import Observer
+from watchdog.observers.polling import PollingObserver
+
+from ..config import ERP_DB_PATH, ERP_WATCH, ERP_WATCH_DEBOUNCE, ERP_WATCH_POLLING
+from .refresher import TABLE_LOADERS, refresh
+
+logger = logging.getLogger(__name__)
+
+TABLE_EXTENSIONS = ('.dbf', '.fpt', '.dbt')
+
+
+def _table_name(path: str) -> str | None:
+    """Table stored in path, None for files of tables the app doesn't load"""
+    name, ext = os.path.splitext(os.path.basename(path))
+    if ext.lower() not in TABLE_EXTENSIONS or name.lower() not in TABLE_LOADERS:
+        return None
+    return name.lower()
+
+
+class TableChanges(FileSystemEventHandler):
+    """Refresh a table once the writes to its files stop"""
+
+    def __init__(self, debounce: float = ERP_WATCH_DEBOUNCE):
+        self.debounce = debounce
+        self._lock = threading.Lock()
+        self._timers: dict[str, threading.Timer] = {}
+
+    def on_any_event(self, event: FileSystemEvent) -> None:
+        if event.is_directory or event.event_type not in ('created', 'modified', 'moved', 'closed'):
+            return
+        # Tables replaced by renaming a temporary file show up as moves
+        table_name = _table_name(event.dest_path or event.src_path)
+        if table_name is None:
+            return
+
+        with self._lock:
+            timer = self._timers.pop(table_name, None)
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(self.debounce, self._refresh, args=(table_name,))
+            timer.daemon = True
+            self._timers[table_name] = timer
+            timer.start()
+
+    def _refresh(self, table_name: str) -> None:
+        with self._lock:
+            self._timers.pop(table_name, None)
+        if refresh(table_name):
+            logger.info('Reloaded %s', table_name)
+
+
+def watches_tables() -> bool:
+    """True when ERP_DB_PATH is a directory the watcher can follow"""
+    return ERP_WATCH and not ERP_DB_PATH.startswith('http') and os.path.isdir(ERP_DB_PATH)
+
+
+@st.cache_resource
+def start_watcher():
+    """Start watching ERP_DB_PATH, once per server process. None when it isn't watched"""
+    if not watches_tables():
+        return None
+
+    observer = PollingObserver() if ERP_WATCH_POLLING else Observer()
+    observer.schedule(TableChanges(), ERP_DB_PATH, recursive=False)
+    observer.daemon = True
+    observer.start()
+    return observer
@@ -6,8 +6,8 @@ from ..data.purchase_orders import get_pos
 from ..data.suppliers import get_suppliers
 
 from ..utils.dates_calculator import range_of_months_to_dates
+from ..utils.single_flight import single_flight
 
-from ..config import get_mp_business_unit
 
 """
 FUNCIONES A REALIZAR:
@@ -32,31 +32,39 @@ def _weighted_avg(group, avg_col, weight_col):
         return 0
 
 # The business unit filter just works for classes MOLIDO and RESINA
+@single_flight
 def transform_dataframe(base_month: str, 
                         base_year: str, 
                         po_class: str = None, 
                         business_units: list[str] = [], 
                         mp_subclasses: list[str] = None, 
-                        range_of_months: int = None) -> pd.DataFrame:
+                        range_of_months: int = None,
+                        open_orders: bool = False) -> pd.DataFrame:
 
-    pos = get_pos()
     suppliers = get_suppliers()
     products = get_products_df()
 
     if range_of_months:
         start_date, end_date = range_of_months_to_dates(base_month, base_year, range_of_months)
 
+        pos = get_pos(start_date=start_date, end_date=end_date)
         pos = pos[pos['FECH_ENT'].between(start_date, end_date)]
+    elif open_orders:
+        # Just the orders pending to be supplied, whatever their date
+        pos = get_pos(open_orders=True)
+    else:
+        pos = get_pos()
 
     if po_class:
         pos = pos[pos['CSE_PROD'] == (po_class)]
 
-    products.drop(columns=['CSE_PROD'], inplace=True)
+    products = products.drop(columns=['CSE_PROD', 'BU'])
     
     main_df = pos.join(suppliers, on='CVE_PROV', how='left')
     main_df = main_df.join(products, on='CVE_PROD')
 
-    main_df['BUSINESS_UNIT'] = main_df['SUB_SUBCSE'].apply(lambda x: get_mp_business_unit(x))
+    # Orders of products not in the catalog are 'OTROS' too
+    main_df['BUSINESS_UNIT'] = main_df.pop('BU_MP').fillna('OTROS')
 
     if business_units and len(business_units) > 0:
         main_df = main_df[main_df['BUSINESS_UNIT'].isin(business_units)]
@@ -99,10 +107,10 @@ def get_prices_by_client_and_resin(base_month,
     df['TOT_PROD_MN'] = df['CANT_PROD'] * df['VALOR_MN']
     
     if (just_by_resin):
-        df = df.groupby(['SUB_CSE'])[['CANT_KG', 'TOT_PROD_MN']].sum()
+        df = df.groupby(['SUB_CSE'], observed=True)[['CANT_KG', 'TOT_PROD_MN']].sum()
 
     else:
-        df = df.groupby(['SUB_CSE', 'NOM_PROV'])[['CANT_KG', 'TOT_PROD_MN']].sum()
+        df = df.groupby(['SUB_CSE', 'NOM_PROV'], observed=True)[['CANT_KG', 'TOT_PROD_MN']].sum()
 
     df['VALOR_KG_MN'] = df['TOT_PROD_MN'] / df['CANT_KG']
     df = df.reset_index()
@@ -125,7 +133,8 @@ def get_to_be_supplied_orders_by_resin(base_month,
                              base_year=base_year, 
                              po_class=po_class, 
                              business_units=business_units,
-                             mp_subclasses=mp_subclasses)
+                             mp_subclasses=mp_subclasses,
+                             open_orders=True)
     
     if df.empty:
         return df
@@ -133,7 +142,7 @@ def get_to_be_supplied_orders_by_resin(base_month,
     df = df[df['STATUS'] != 'Surtido']
     df['SALDO_KG'] = df['SALDO'] * np.where(df['UNI_MED'] == 'KG', 1, df['FACT_PESO'])
     df['TOT_SALDO_MN'] = df['SALDO'] * df['VALOR_MN']
-    df = df.groupby('SUB_CSE')[['SALDO_KG', 'TOT_SALDO_MN']].sum()
+    df = df.groupby('SUB_CSE', observed=True)[['SALDO_KG', 'TOT_SALDO_MN']].sum()
     df['COSTO_PROM_OC'] = df['TOT_SALDO_MN'] / df['SALDO_KG']
     df.reset_index(inplace=True)
     return df
@@ -156,18 +165,17 @@ def get_po_resins_prices_series(base_month: str,
     if df.empty:
         return None
     
-    df['FECH_ENT'] = pd.to_datetime(df['FECH_ENT'], errors='coerce')
     df['MES_ENT'] = df['FECH_ENT'].dt.to_period('M')
 
     grouped_df = (
-        df.groupby(['SUB_CSE', 'MES_ENT'])[['VALOR_MN', 'CANT_KG']]
+        df.groupby(['SUB_CSE', 'MES_ENT'], observed=True)[['VALOR_MN', 'CANT_KG']]
         .apply(lambda x: (x['VALOR_MN'] * x['CANT_KG']).sum() / x['CANT_KG'].sum())
         .reset_index(name='PRECIO_KG')
     )
     grouped_df['MES_ENT'] = grouped_df['MES_ENT'].dt.to_timestamp()
 
     series = []
-    for cls, data in grouped_df.groupby('SUB_CSE'):
+    for cls, data in grouped_df.groupby('SUB_CSE', observed=True):
         curr_serie = data[['MES_ENT', 'PRECIO_KG']].set_index('MES_ENT')['PRECIO_KG']
         series.append((curr_serie, cls))
     
@@ -189,7 +197,6 @@ def get_month_savings(base_month: str,
     if df.empty:
         return []
     
-    df['FECH_ENT'] = pd.to_datetime(df['FECH_ENT'], errors='coerce')
     df['MES_ENT'] = df['FECH_ENT'].dt.to_period('M')
 
     current_month = df['MES_ENT'].max()
@@ -203,12 +210,12 @@ def get_month_savings(base_month: str,
         savings = int(0)
     
     else:
-        avg_prices_prev = df_prev.groupby('SUB_CSE')[['VALOR_MN', 'CANT_KG']].apply(_weighted_avg, 'VALOR_MN', 'CANT_KG').rename(
+        avg_prices_prev = df_prev.groupby('SUB_CSE', observed=True)[['VALOR_MN', 'CANT_KG']].apply(_weighted_avg, 'VALOR_MN', 'CANT_KG').rename(
             'VALOR_PREV'
         )
 
         
-        avg_prices_current = df_current.groupby('SUB_CSE')[['VALOR_MN', 'CANT_KG']].apply(
+        avg_prices_current = df_current.groupby('SUB_CSE', observed=True)[['VALOR_MN', 'CANT_KG']].apply(
             lambda g: pd.Series({
                 'VALOR_CURR': _weighted_avg(g, 'VALOR_MN', 'CANT_KG'),
                 'CURR_KG': g['CANT_KG'].sum()
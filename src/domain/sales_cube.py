@@ -0,0 +1,243 @@
+""" SALES CUBE
+
+    Billing and sales orders pre-aggregated by day (FECHA), class (CSE_PROD),
+    agent (CVE_AGE) and client (CVE_CTE), the grain of the questions of the
+    Facturación and Trend pages. Each cell carries its business unit (BU) and
+    client name (NOM_CTE) and these measures:
+
+        FACT_MN, FACT_KG            invoiced
+        NC_MN, NC_KG                credit notes, every type
+        ANTI_MN, DESC_MN, DEVOL_MN  advances, discounts and returns
+        PED_MN, PED_KG              orders placed, by delivery date
+        ABIERTO_MN, ABIERTO_KG      orders placed still to be supplied
+        SALDO_MN, SALDO_KG          open balance of the orders
+        N_FACT, N_NC, N_PED, N_ABIERTO
+                                    invoice, credit and order lines behind the cell
+
+    Net billing is FACT - NC. The counts tell which groups had any of those
+    rows, so a roll up keeps the same groups as grouping the detail rows did.
+
+    The cube is built once per version of the tables from the signed entries
+    of invoice lines and credit notes and from the order details, and
+    shared by every session. With ERP_CHUNK_RECORDS it is built batch by batch
+    of details, keeping only the cells summed so far. The domain functions slice
+    it (get_cube) and roll it up (roll_up) instead of scanning detail rows.
+"""
+import itertools
+import pandas as pd
+import numpy as np
+
+from ..config import get_agents_filtered_list_ids
+
+from ..data.facturas import iter_facturas_df
+from ..data.sales_orders import iter_sales_orders
+from ..data.productos import get_products_df
+from ..data.credits import iter_credits_df, get_credit_bill_classes
+from ..data.agents import get_agents_df
+from ..data.clientes import get_clients_df
+from ..data.categories import categorize
+from ..data.business_units import business_units
+
+from ..utils.dates_calculator import filter_dataframe_by_range_of_months
+from ..utils.frame_cache import shared_frame
+
+DIMENSIONS = ['FECHA', 'CSE_PROD', 'CVE_AGE', 'CVE_CTE']
+# Columns the cube can be rolled up by, its dimensions and their attributes
+GROUPING_COLUMNS = DIMENSIONS + ['BU', 'NOM_CTE']
+
+
+def add_line_amounts(df: pd.DataFrame) -> pd.DataFrame:
+    """MN (SUBT_PROD_MN) and KG (TOT_KG_PROD) of every invoice line"""
+    products_df = get_products_df().drop(columns=['CSE_PROD', 'SUB_CSE', 'SUB_SUBCSE', 'BU', 'BU_MP'])
+
+    df = df.join(products_df, on='CVE_PROD', how='left')
+
+    df['SUBT_PROD_MN'] = (df['SUBT_PROD'] - df['DESCU_PROD']) * np.where(df['CVE_MON'] != 1, df['TIP_CAM'], 1)
+    # TODO: REVISAR SI PREFIEREN QUE COINCIDA CON SAI O NO
+    #df['TOT_KG_PROD'] = df['CANT_SURT'] * np.where(df['UNI_MED'] != 'KG', df['FACT_PESO'], 1)
+    # TODO HABILITAR CUANDO CUESTIÓNEN PORQUE NO DA IGUAL CON EL SAI
+    df['TOT_KG_PROD'] = df['CANT_SURT'] * df['FACT_PESO']
+    return df
+
+
+def classify_credits(df: pd.DataFrame) -> pd.DataFrame:
+    """Type of every credit note (TIPO_NOTA) and its class, from its product or from the bill it applies to"""
+    # CLASSIFY CREDITS
+    categories = ['ANTI', 'DESC', 'DEVOL']
+    conditions = [
+        (df['CVE_PROD'] == 'OTRO-40'),
+        (df['TIP_NOT'] == 'Descuento'),
+        (df['TIP_NOT'] == 'Dev. Just.') & (df['CVE_PROD'] != 'OTRO-40')
+    ]
+
+    # Add a type to notes
+    df['TIPO_NOTA'] = np.select(conditions, categories, default='SIN_CATEGORIA')
+
+    # Classify credits based on product
+    products = get_products_df()
+    products = products[['CSE_PROD', 'FACT_PESO']]
+
+    df = df.join(products, on='CVE_PROD', how='left')
+
+    # Credits to classify based on bill
+    mask = (df['TIPO_NOTA'].isin(['ANTI', 'DESC']))
+    classes = get_credit_bill_classes(df.loc[mask, 'FACT_ID'])
+
+    # OTRO and the bill classes may not be among the product classes yet
+    df['CSE_PROD'] = categorize(df['CSE_PROD'], 'CSE_PROD', classes)
+    df.loc[mask, 'CSE_PROD'] = classes
+    df['BU'] = business_units(df['CSE_PROD'])
+    return df
+
+
+def returned_kg(df: pd.DataFrame) -> np.ndarray:
+    """Kilograms returned by every credit note, 0 for the ones that aren't returns"""
+    return np.where(df['TIPO_NOTA'] == 'DEVOL',
+                    df['CANTIDAD'] * np.where(df['UNIDAD'] != 'KG', df['FACT_PESO'], 1),
+                    0)
+
+
+def add_order_amounts(df: pd.DataFrame) -> pd.DataFrame:
+    """MN and KG placed (SUBT_PROD_MN, TOT_KG) and still to be supplied (SALDO_PROD_MN, SALDO_KG)
+    of every order line, with FACT_PESO of its product already joined"""
+    df['SUBT_PROD_MN'] = df['CANT_PROD'] * df['VALOR_PROD'] * np.where(df['CVE_MON'] == 1, 1, df['TIP_CAM'])
+    df['SALDO_PROD_MN'] = np.where(df['STATUS1'] == '', df['SALDO'], 0) * df['VALOR_PROD'] * np.where(df['CVE_MON'] == 1, 1, df['TIP_CAM'])
+
+    # Deshabilitado para que de igual que el SAI, (Hay algunos productos con factor de 0 y unidades KG)
+    # df['SALDO_KG'] = np.where(df['STATUS1'] == '', df['SALDO'], 0) * np.where(df['UNI_MED'] == 'KG', 1, df['FACT_PESO'])
+    # df['TOT_KG'] = df['CANT_PROD'] * np.where(df['UNI_MED'] == 'KG', 1, df['FACT_PESO'])
+    df['TOT_KG'] = df['CANT_PROD'] * df['FACT_PESO']
+    df['SALDO_KG'] = np.where(df['STATUS1'] == '', df['SALDO'], 0) * df['FACT_PESO']
+    return df
+
+
+"""
+SIGNED ENTRIES
+
+    Invoice lines (TIPO 'FACTURA') and credit notes (TIPO their TIPO_NOTA) with
+    the cube dimensions already resolved: invoice lines are positive MN and KG,
+    credit notes (advances, discounts and returns) negative. They replace the
+    cached sales ledger, the entries of a batch of details are only kept until
+    they are summed into cells.
+"""
+
+ENTRY_COLUMNS = DIMENSIONS + ['TIPO', 'MN', 'KG']
+
+
+def _bill_entries(df: pd.DataFrame) -> pd.DataFrame:
+    entries = add_line_amounts(df).rename(columns={'FALTA_FAC': 'FECHA', 'SUBT_PROD_MN': 'MN', 'TOT_KG_PROD': 'KG'})
+    entries['TIPO'] = 'FACTURA'
+    return entries[ENTRY_COLUMNS]
+
+
+def _credit_entries(df: pd.DataFrame) -> pd.DataFrame:
+    df = classify_credits(df)
+    entries = df.rename(columns={'TIPO_NOTA': 'TIPO', 'NO_AGENTE': 'CVE_AGE', 'NO_CLIENTE': 'CVE_CTE'})
+    entries['MN'] = -df['SUBT_MN']
+    entries['KG'] = -returned_kg(df)
+    return entries[ENTRY_COLUMNS]
+
+
+@shared_frame
+def get_sales_cube() -> pd.DataFrame:
+    """Billing and order measures by day, class, agent and client"""
+    # Batches are read one at a time, only the cells summed so far are kept. Without
+    # ERP_CHUNK_RECORDS every table is a single batch, never cached as a full loader
+    cells = itertools.chain((_billing_cells(_bill_entries(df)) for df in iter_facturas_df()),
+                            (_billing_cells(_credit_entries(df)) for df in iter_credits_df()),
+                            (_order_cells(df) for df in iter_sales_orders()))
+    cube = None
+    for batch in cells:
+        cube = batch if cube is None else _add_cells(cube, batch)
+
+    cube = cube.reset_index()
+    counts = ['N_FACT', 'N_NC', 'N_PED', 'N_ABIERTO']
+    cube[counts] = cube[counts].astype('int64')
+
+    cube['CSE_PROD'] = categorize(cube['CSE_PROD'], 'CSE_PROD')
+    cube['BU'] = business_units(cube['CSE_PROD'])
+
+    clients = get_clients_df()
+    return cube.join(clients, on='CVE_CTE')
+
+
+def _add_cells(cube: pd.DataFrame, cells: pd.DataFrame) -> pd.DataFrame:
+    # Days with both billing and orders, or cells split across batches, are added up.
+    # Missing dates, classes, agents or clients are cells too, they count in the totals
+    return pd.concat([cube, cells]).groupby(level=DIMENSIONS, observed=True, dropna=False).sum()
+
+
+def _billing_cells(entries: pd.DataFrame) -> pd.DataFrame:
+    tipo = entries['TIPO']
+    bills = tipo == 'FACTURA'
+    # Credit notes are negative entries
+    credited = 0 - entries['MN']
+
+    cells = entries[DIMENSIONS].assign(
+        FACT_MN=entries['MN'].where(bills, 0),
+        FACT_KG=entries['KG'].where(bills, 0),
+        NC_MN=credited.where(~bills, 0),
+        NC_KG=(0 - entries['KG']).where(~bills, 0),
+        ANTI_MN=credited.where(tipo == 'ANTI', 0),
+        DESC_MN=credited.where(tipo == 'DESC', 0),
+        DEVOL_MN=credited.where(tipo == 'DEVOL', 0),
+        N_FACT=bills.astype('int64'),
+        N_NC=(~bills).astype('int64'),
+    )
+    return cells.groupby(DIMENSIONS, observed=True, dropna=False).sum()
+
+
+def _order_cells(df: pd.DataFrame) -> pd.DataFrame:
+    products = get_products_df()[['FACT_PESO']]
+    df = add_order_amounts(df.join(products, on='CVE_PROD', how='left'))
+    open_lines = df['STATUS1'] == ''
+
+    cells = df[['CSE_PROD', 'CVE_AGE', 'CVE_CTE']].assign(
+        FECHA=df['FECHA_ENT'],
+        PED_MN=df['SUBT_PROD_MN'],
+        PED_KG=df['TOT_KG'],
+        ABIERTO_MN=df['SUBT_PROD_MN'].where(open_lines, 0),
+        ABIERTO_KG=df['TOT_KG'].where(open_lines, 0),
+        SALDO_MN=df['SALDO_PROD_MN'],
+        SALDO_KG=df['SALDO_KG'],
+        N_PED=1,
+        N_ABIERTO=open_lines.astype('int64'),
+    )
+    return cells.groupby(DIMENSIONS, observed=True, dropna=False).sum()
+
+
+def get_cube(base_month: str,
+             base_year: str,
+             range_of_months: int = 1,
+             pt_classes: list[str] = None,
+             agents_list: list[str] = None) -> pd.DataFrame:
+    """Cells of the sales cube in the range of months, of pt_classes and agents_list"""
+    cube = filter_dataframe_by_range_of_months(get_sales_cube(),
+                                               'FECHA',
+                                               base_month,
+                                               base_year,
+                                               range_of_months)
+    if pt_classes:
+        cube = cube[cube['CSE_PROD'].isin(pt_classes)]
+
+    if agents_list:
+        agents_to_filter = get_agents_filtered_list_ids(get_agents_df(), agents_list)
+        cube = cube[cube['CVE_AGE'].isin(agents_to_filter)]
+
+    return cube
+
+
+def check_grouping(col_name: str) -> None:
+    """Raise ValueError if the cube can't be rolled up by col_name"""
+    if col_name not in GROUPING_COLUMNS:
+        raise ValueError(f'Sales cube has no column {col_name!r}, it can only be grouped by {", ".join(GROUPING_COLUMNS)}')
+
+
+def roll_up(cube: pd.DataFrame, by: list[str], measures: list[str], present: str = None) -> pd.DataFrame:
+    """Sums of measures by the columns in by. With present, a count, only the groups
+    with some of those rows are kept"""
+    cols = measures + [present] if present else measures
+    df = cube.groupby(by, observed=True)[cols].sum()
+    if present:
+        df = df[df[present] > 0].drop(columns=[present])
+    return df
@@ -1,24 +1,25 @@
 import pandas as pd
-import numpy as np
 
 from typing import Literal
 
-from ..config import get_agents_filtered_list_ids, get_business_unit
+from ..config import get_agents_filtered_list_ids
 
 from ..data.sales_orders import get_sales_orders
 from ..data.productos import get_products_df
 from ..data.clientes import get_clients_df
 from ..data.agents import get_agents_df
 
-from ..utils.dates_calculator import filter_dataframe_by_range_of_months
-from ..utils.timelines import create_timeline_df
+from ..utils.dates_calculator import filter_dataframe_by_range_of_months, range_of_months_to_dates
 from ..utils.formatting import to_currency, to_kg
+from ..utils.single_flight import single_flight
 
 from ..domain.billing_calcs import get_net_billing_by_agent, get_net_billing_by_col
+from ..domain.sales_cube import add_order_amounts, get_cube, roll_up, check_grouping
 
 
 # In the params, or df is filtered by status or range of time
 # For date filtering, the function must get a month and a year
+@single_flight
 def transform_so_df(base_month: str = None,
                     base_year: str = None,
                     range_of_months: str = None,
@@ -26,7 +27,21 @@ def transform_so_df(base_month: str = None,
                     order_status: Literal['Por Surtir', 'Surtido'] | None = None,
                     agents_list: list[str] | None = None) -> pd.DataFrame:
     
-    df = get_sales_orders(with_details=True)
+    if (base_month and base_year and range_of_months):
+        df = get_sales_orders(True, *range_of_months_to_dates(base_month, base_year, range_of_months))
+    else:
+        df = get_sales_orders(with_details=True)
+
+    return _transform_orders(df, base_month, base_year, range_of_months, pt_classes, order_status, agents_list)
+
+
+def _transform_orders(df: pd.DataFrame,
+                      base_month: str,
+                      base_year: str,
+                      range_of_months: str,
+                      pt_classes: list[str],
+                      order_status: Literal['Por Surtir', 'Surtido'] | None,
+                      agents_list: list[str] | None) -> pd.DataFrame:
 
     if (base_month and base_year and range_of_months):
 
@@ -59,17 +74,23 @@ def transform_so_df(base_month: str = None,
     df = df.join(agents_df, on='CVE_AGE', how='left')
     df = df.join(clients, on='CVE_CTE', how='left')
 
-    df['SUBT_PROD_MN'] = df['CANT_PROD'] * df['VALOR_PROD'] * np.where(df['CVE_MON'] == 1, 1, df['TIP_CAM'])
-    df['SALDO_PROD_MN'] = np.where(df['STATUS1'] == '', df['SALDO'], 0) * df['VALOR_PROD'] * np.where(df['CVE_MON'] == 1, 1, df['TIP_CAM'])
+    return add_order_amounts(df)
 
-    # Deshabilitado para que de igual que el SAI, (Hay algunos productos con factor de 0 y unidades KG)
-    # df['SALDO_KG'] = np.where(df['STATUS1'] == '', df['SALDO'], 0) * np.where(df['UNI_MED'] == 'KG', 1, df['FACT_PESO'])
-    # df['TOT_KG'] = df['CANT_PROD'] * np.where(df['UNI_MED'] == 'KG', 1, df['FACT_PESO'])
-    df['TOT_KG'] = df['CANT_PROD'] * df['FACT_PESO']
-    df['SALDO_KG'] = np.where(df['STATUS1'] == '', df['SALDO'], 0) * df['FACT_PESO']
-    
 
-    return df
+def _orders_of_status(cube: pd.DataFrame, order_status: Literal['Por Surtir', 'Surtido'] | None) -> pd.DataFrame:
+    """Cube cells with the order measures of the lines of order_status, named as in transform_so_df,
+    and how many lines they are (N)"""
+    if order_status == 'Por Surtir':
+        mn, kg, n = cube['ABIERTO_MN'], cube['ABIERTO_KG'], cube['N_ABIERTO']
+    elif order_status == 'Surtido':
+        mn, kg, n = cube['PED_MN'] - cube['ABIERTO_MN'], cube['PED_KG'] - cube['ABIERTO_KG'], cube['N_PED'] - cube['N_ABIERTO']
+    else:
+        mn, kg, n = cube['PED_MN'], cube['PED_KG'], cube['N_PED']
+
+    # Supplied lines have no balance
+    saldo_mn, saldo_kg = (0.0, 0.0) if order_status == 'Surtido' else (cube['SALDO_MN'], cube['SALDO_KG'])
+    return cube.assign(SUBT_PROD_MN=mn, SALDO_PROD_MN=saldo_mn, TOT_KG=kg, SALDO_KG=saldo_kg, N=n)
+
 
 def get_sales_orders_amount(base_month: str,
                             base_year: str,
@@ -77,18 +98,16 @@ def get_sales_orders_amount(base_month: str,
                             agents_list: list[str] = None,
                             range_of_months: int = 1,
                             unit: Literal['MN', 'KG'] = 'MN') -> float:
-    df = transform_so_df(
-        base_month=base_month,
-        base_year=base_year,
-        range_of_months=range_of_months,
-        pt_classes=pt_classes,
-        agents_list=agents_list
-    )
+    cube = get_cube(base_month=base_month,
+                    base_year=base_year,
+                    range_of_months=range_of_months,
+                    pt_classes=pt_classes,
+                    agents_list=agents_list)
 
     if unit == 'KG':
-        result = df['TOT_KG'].sum()
+        result = cube['PED_KG'].sum()
     else:
-        result = df['SUBT_PROD_MN'].sum()
+        result = cube['PED_MN'].sum()
 
     return result
 
@@ -99,18 +118,14 @@ def to_be_supplied_orders_until_base_month(base_month: str,
                                            agents_list: list[str] = None,
                                            amount_of_past_months: int = 6) -> pd.DataFrame:
     
-    df = transform_so_df(pt_classes=pt_classes,
+    # Open orders are only looked up within the last amount_of_past_months delivery months
+    df = transform_so_df(base_month=base_month,
+                         base_year=base_year,
+                         range_of_months=amount_of_past_months,
+                         pt_classes=pt_classes,
                          agents_list=agents_list,
                          order_status='Por Surtir')
     
-    df = filter_dataframe_by_range_of_months(
-        df,
-        date_col='FECHA_ENT',
-        base_month=base_month,
-        base_year=base_year,
-        range_of_months=amount_of_past_months
-    )
-    
     return df
 
 def get_to_be_supplied_orders_for_trend(base_month: str,
@@ -120,16 +135,18 @@ def get_to_be_supplied_orders_for_trend(base_month: str,
                                         unit: Literal['MN', 'KG'] = 'MN', 
                                         amount_of_past_months: int = 6) -> float:
     
-    df = to_be_supplied_orders_until_base_month(base_month=base_month,
-                                                base_year=base_year, 
-                                                pt_classes=pt_classes,
-                                                agents_list=agents_list,
-                                                amount_of_past_months=amount_of_past_months)
+    # Open orders are only looked up within the last amount_of_past_months delivery months
+    cube = get_cube(base_month=base_month,
+                    base_year=base_year,
+                    range_of_months=amount_of_past_months,
+                    pt_classes=pt_classes,
+                    agents_list=agents_list)
     
+    # Supplied lines have no balance
     if unit == 'KG':
-        result = df['SALDO_KG'].sum()
+        result = cube['SALDO_KG'].sum()
     else:
-        result = df['SALDO_PROD_MN'].sum()
+        result = cube['SALDO_MN'].sum()
 
     return result
 
@@ -166,14 +183,13 @@ def get_so_timeseries(base_month: str,
                       agents_list: list[str] = None,
                       acum: bool = True) -> pd.DataFrame:
     
-    df = transform_so_df(base_month=base_month,
-                         base_year=base_year,
-                         range_of_months=range_of_months,
-                         pt_classes=pt_classes,
-                         agents_list=agents_list)
+    cube = get_cube(base_month=base_month,
+                    base_year=base_year,
+                    range_of_months=range_of_months,
+                    pt_classes=pt_classes,
+                    agents_list=agents_list)
     
-    df_ts = create_timeline_df(df, 'FECHA_ENT')
-    df_ts = df_ts.groupby(df_ts.index)[['TOT_KG', 'SUBT_PROD_MN']].sum()
+    df_ts = roll_up(_orders_of_status(cube, None), ['FECHA'], ['TOT_KG', 'SUBT_PROD_MN'], present='N')
 
     if acum:
         df_ts['SUBT_PROD_MN'] = df_ts['SUBT_PROD_MN'].cumsum()
@@ -189,28 +205,20 @@ def get_sales_orders_by_agent(base_month: str,
                               order_status: Literal['Por Surtir', 'Surtido'] = None,
                               with_business_units: bool = False) -> pd.DataFrame:
     
-    df = transform_so_df(
-        base_month=base_month,
-        base_year=base_year,
-        range_of_months=range_of_months,
-        pt_classes=pt_classes,
-        agents_list=agents_list,
-        order_status=order_status
-    )
+    cube = get_cube(base_month=base_month,
+                    base_year=base_year,
+                    range_of_months=range_of_months,
+                    pt_classes=pt_classes,
+                    agents_list=agents_list)
 
-    cols = ['CVE_AGE', 'NOM_AGE']
+    cols = ['CVE_AGE', 'BU'] if with_business_units else ['CVE_AGE']
+    df = roll_up(_orders_of_status(cube, order_status), cols, ['SUBT_PROD_MN', 'SALDO_PROD_MN', 'TOT_KG', 'SALDO_KG'], present='N')
 
-    if with_business_units:
-        cols.append('BU')
-        df['BU'] = df['CSE_PROD'].apply(lambda x: get_business_unit(x))
-
-    df = df.groupby(cols)[['SUBT_PROD_MN', 'SALDO_PROD_MN', 'TOT_KG', 'SALDO_KG']].sum()
-    df.fillna(0, inplace=True)
-    df.reset_index(inplace=True)
-    cols.pop(1)
-    df.set_index(cols, inplace=True)
+    # Just the agents with a name
+    agents_df = get_agents_df(just_name=True)
+    df = df.join(agents_df, how='inner').dropna(subset=['NOM_AGE'])
 
-    return df
+    return df[['NOM_AGE', 'SUBT_PROD_MN', 'SALDO_PROD_MN', 'TOT_KG', 'SALDO_KG']]
 
 
 def get_trend_by_agent(base_month: str,
@@ -234,8 +242,9 @@ def get_trend_by_agent(base_month: str,
                                         range_of_months=6,
                                         with_business_units=with_business_units)
     
-    billing.drop(columns=['NOM_AGE'], inplace=True)
-    df = orders.join(billing, how='outer')
+    df = orders.join(billing.drop(columns=['NOM_AGE']), how='outer')
+    # Agents with billing but no orders take their name from billing
+    df['NOM_AGE'] = df['NOM_AGE'].fillna(billing['NOM_AGE'])
     df.fillna(0, inplace=True)
 
     df['TREND_MN'] = df['NET_MN'] + df['SALDO_PROD_MN']
@@ -254,14 +263,18 @@ def get_so_and_trend_by_col(so_col_name: str,
                             pt_classes: list[str] = None,
                             agents_list: list[str] = None)-> pd.DataFrame:
     """ so_col_name and billing_col_name must contain same values in order to
-        perfrom correctly the join between the billing dataframe and the so df"""
-    
-    to_be_supplied = to_be_supplied_orders_until_base_month(
-        base_month=base_month,
-        base_year=base_year,
-        pt_classes=pt_classes,
-        agents_list=agents_list
-    )
+        perfrom correctly the join between the billing dataframe and the so df.
+        Both must be columns of the sales cube (GROUPING_COLUMNS)"""
+    check_grouping(so_col_name)
+    check_grouping(billing_col_name)
+
+    # Open orders of the last 6 delivery months
+    open_cube = get_cube(base_month=base_month,
+                         base_year=base_year,
+                         range_of_months=6,
+                         pt_classes=pt_classes,
+                         agents_list=agents_list)
+    to_be_supplied = roll_up(_orders_of_status(open_cube, 'Por Surtir'), [so_col_name], ['SALDO_PROD_MN', 'SALDO_KG'], present='N')
 
     billing = get_net_billing_by_col(col_name=billing_col_name,
                                      base_month=base_month,
@@ -270,16 +283,12 @@ def get_so_and_trend_by_col(so_col_name: str,
                                      agents_list=agents_list,
                                      range_of_months=range_of_months)
 
-    orders = transform_so_df(
-        base_month=base_month,
-        base_year=base_year,
-        range_of_months=range_of_months,
-        pt_classes=pt_classes,
-        agents_list=agents_list
-    )
-
-    orders = orders.groupby(so_col_name)[['SUBT_PROD_MN', 'TOT_KG']].sum()
-    to_be_supplied = to_be_supplied.groupby(so_col_name)[['SALDO_PROD_MN', 'SALDO_KG']].sum()
+    cube = get_cube(base_month=base_month,
+                    base_year=base_year,
+                    range_of_months=range_of_months,
+                    pt_classes=pt_classes,
+                    agents_list=agents_list)
+    orders = roll_up(_orders_of_status(cube, None), [so_col_name], ['SUBT_PROD_MN', 'TOT_KG'], present='N')
 
     df = orders.join(to_be_supplied, how='outer')
     billing.drop(columns=['SUBT_PROD_MN'], inplace=True)
@@ -2,8 +2,8 @@ import pandas as pd
 import numpy as np
 from typing import Literal
 
-from ..config import get_business_unit, get_mp_business_unit
 from ..utils.formatting import to_currency
+from ..utils.single_flight import single_flight
 
 from ..data.stocks import get_existencias
 from ..data.productos import get_products_df
@@ -17,6 +17,7 @@ OPERACIONES QUE DEBE DE HACER EXISTENCIA
     - Filtrar unidad de negocio
 """
 
+@single_flight
 def transform_dataframe(po_classes: list[str] = [], 
                         stock_of: Literal['PT', 'MP'] = None, 
                         business_units: list[str] = [],
@@ -30,10 +31,8 @@ def transform_dataframe(po_classes: list[str] = [],
 
     # For filtering business unit, there must be an stock_of_param
     if stock_of == 'MP':
-        products['BU'] = products['SUB_SUBCSE'].apply(lambda x: get_mp_business_unit(x))
-        
-    else: 
-        products['BU'] = products['CSE_PROD'].apply(lambda x: get_business_unit(x))
+        products['BU'] = products['BU_MP']
+    products = products.drop(columns=['BU_MP'])
 
     if (len(business_units) > 0):
         products = products[products['BU'].isin(business_units)]
@@ -53,7 +52,7 @@ def get_mp_stocks_with_value_and_avg_cost(po_classes= list[str], business_units:
     df = transform_dataframe(po_classes=po_classes, stock_of='MP', business_units=business_units, sub_classes=sub_classes)
     df['VALOR_TOT'] = df['EXISTENCIA'] * df['COSTO_PROM']
 
-    df = df.groupby(['SUB_CSE']).agg(
+    df = df.groupby(['SUB_CSE'], observed=True).agg(
             EXI_KG=('EXI_KG', 'sum'),
             VALOR_TOT=('VALOR_TOT', 'sum'),
             COSTO_MIN_EXI=('COSTO_PROM', 'min'),
@@ -79,6 +78,9 @@ def render_styled_df(po_classes: list[str] = [],
              'UNI_MED', 'COSTO_PROM', 'LUGAR','LOTE', 'FECH_UMOD', 'FECH_LOTE']]
     
     df['COSTO_PROM'] = df['COSTO_PROM'].apply(lambda x: to_currency(x))
+    # Show dates without time
+    for col in ['FECH_UMOD', 'FECH_LOTE']:
+        df[col] = df[col].dt.date
     df.sort_values(['SUB_CSE', 'CVE_PROD'], ascending=True, inplace=True)
 
     df.set_index('CVE_PROD', inplace=True)
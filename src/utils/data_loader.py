@@ -1,45 +1,24 @@
-from dbfread import DBF
 import pandas as pd
 import streamlit as st
-import requests
-import tempfile
-import os
 
-from src.config import get_table_conn
+from typing import Iterator
 
-@st.cache_data
-def load_dbf(table_name: str, columns: list = None, index:list = None) -> pd.DataFrame:
-    conn_path = get_table_conn(table_name)
-
-    if conn_path.startswith("http"):
-        try:
-            # Add timeout to avoid hanging indefinitely
-            response = requests.get(conn_path, timeout=10)
-            response.raise_for_status()
+from src.config import ERP_CACHE_DIR, ERP_CHUNK_RECORDS, get_table_conn
+from src.data.schemas import apply_schema
+from src.utils.dbf_reader import iter_dbf_chunks
+from src.utils.table_cache import sync_table
+from src.utils.table_store import get_table, derive, mark_failed, table_failed
 
-            # Create a localized temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".dbf") as tmp:
-                tmp.write(response.content)
-                tmp_path = tmp.name
+def _projection(columns: list | None, index: list | str | None) -> list | None:
+    """Fields to decode from the table: requested columns plus index columns"""
+    if not columns:
+        return None
+    if isinstance(index, str):
+        index = [index]
+    return list(columns) + [c for c in (index or []) if c not in columns]
 
-            # Read DBF from temp file
-            dbf = DBF(tmp_path)
-            df = pd.DataFrame(iter(dbf))
-
-        except Exception as e:
-            st.error(f"Error loading {table_name}: {e}")
-            return pd.DataFrame()
-        finally:
-            # Clean up temp file
-            if 'tmp_path' in locals() and os.path.exists(tmp_path):
-                try:
-                    os.remove(tmp_path)
-                except Exception:
-                    pass
-    else:
-        dbf = DBF(conn_path)
-        df = pd.DataFrame(iter(dbf))
 
+def _select(df: pd.DataFrame, columns: list | None, index: list | str | None) -> pd.DataFrame:
     if index:
         df.set_index(index, inplace=True)
     if columns:
@@ -48,3 +27,69 @@ def load_dbf(table_name: str, columns: list = None, index:list = None) -> pd.Dat
         df = df[available_columns]
 
     return df
+
+
+def load_dbf(table_name: str, columns: list = None, index:list = None, filters: list = None) -> pd.DataFrame:
+    """Load a SAI table. filters are (column, op, value) predicates on its rows,
+    e.g. [('STATUS', '!=', 'Cancelado'), ('FECHA', '>=', date(2025, 1, 1))]
+
+    Not cached: the table is decoded once per version by table_store and the
+    loaders of src/data cache what they build from it.
+    """
+    projection = _projection(columns, index)
+    # Filtered columns are also needed in the decoded table
+    fields = None if projection is None else projection + [f[0] for f in filters or [] if f[0] not in projection]
+
+    if get_table_conn(table_name).startswith("http"):
+        if table_failed(table_name):
+            # Already reported, not downloaded again until the refresher loads it
+            return _empty(table_name, projection, columns, index)
+        try:
+            raw = get_table(table_name, fields)
+        except Exception as e:
+            st.error(f"Error loading {table_name}: {e}")
+            # The page goes on with an empty table, the refresher loads it again and clears what was built from it
+            mark_failed(table_name)
+            return _empty(table_name, projection, columns, index)
+    else:
+        raw = get_table(table_name, fields)
+
+    return _select(derive(raw, projection, filters), columns, index)
+
+
+def _empty(table_name: str, projection: list | None, columns: list | None, index: list | str | None) -> pd.DataFrame:
+    if projection is None:
+        return pd.DataFrame()
+    return _select(apply_schema(pd.DataFrame(columns=projection), table_name), columns, index)
+
+
+def join_details(details: pd.DataFrame, headers: pd.DataFrame, header_ids: pd.Index | None = None) -> pd.DataFrame:
+    """details.join(headers, how='left') without the details of headers dropped by the load filters.
+
+    header_ids are the ids of every header, filtered or not: details of none of them keep empty
+    header columns. Without them only the details of headers are kept.
+    """
+    joined = details.join(headers, how='left')
+    keep = details.index.isin(headers.index)
+    if header_ids is not None:
+        keep |= ~details.index.isin(header_ids)
+    return joined[keep]
+
+
+def iter_dbf(table_name: str, columns: list = None, index: list = None, filters: list = None,
+             chunk_records: int = None) -> Iterator[pd.DataFrame]:
+    """load_dbf in batches of chunk_records records, for tables too big to hold at once. Not cached"""
+    conn_path = get_table_conn(table_name)
+    chunk_records = chunk_records or ERP_CHUNK_RECORDS
+
+    # A remote table can only be read in batches from its on-disk copy
+    if not chunk_records or (conn_path.startswith("http") and not ERP_CACHE_DIR):
+        yield load_dbf(table_name, columns, index, filters)
+        return
+
+    if conn_path.startswith("http"):
+        conn_path = sync_table(table_name, conn_path)
+
+    for df in iter_dbf_chunks(conn_path, _projection(columns, index), filters, chunk_records):
+        # Batches don't go through table_store, declared dtypes are applied here
+        yield _select(apply_schema(df, table_name), columns, index)
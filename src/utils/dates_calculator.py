@@ -27,9 +27,6 @@ def range_of_months_to_dates(base_month: str, base_year: str, range_of_months: i
 def filter_dataframe_by_range_of_months(df: pd.DataFrame, date_col: str, base_month: str, base_year: str, range_of_months: str) -> pd.DataFrame:
     
     start_date, end_date = range_of_months_to_dates(base_month, base_year, range_of_months)
-    
-    if not pd.api.types.is_datetime64_any_dtype(df[date_col]):
-        df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
 
     df = df[df[date_col].between(start_date, end_date)]
 
@@ -0,0 +1,565 @@
+""" COLUMNAR DBF READER
+
+    Reads the fixed-width record area of a .dbf file as a structured NumPy array
+    and decodes every field column-at-a-time. Output matches
+    pd.DataFrame(iter(dbfread.DBF(path))).
+
+    Records are fixed-width, so big local tables can be cut into record ranges
+    decoded in parallel by a pool of worker processes, or read one bounded
+    batch at a time with iter_dbf_chunks.
+"""
+import os
+import mmap
+import math
+import struct
+import operator
+import threading
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+from typing import Iterator, NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dbfread import DBF
+from dbfread.codepages import guess_encoding
+from dbfread.field_parser import FieldParser
+
+from src.config import ERP_MMAP, ERP_PARALLEL_MIN_RECORDS
+
+HEADER_SIZE = 32
+FIELD_SIZE = 32
+
+# Field types stored in a separate memo file
+MEMO_TYPES = 'MGP'
+
+
+class DBFField(NamedTuple):
+    name: str
+    type: str
+    length: int
+    decimal_count: int
+    # Position of the field inside the record, after the deletion flag
+    offset: int
+
+
+class DBFHeader(NamedTuple):
+    dbversion: int
+    numrecords: int
+    headerlen: int
+    recordlen: int
+    encoding: str
+    fields: list[DBFField]
+
+
+def parse_header(buffer) -> DBFHeader:
+    """Parse the table header and field descriptors from the first bytes of a .dbf"""
+    (dbversion, _, _, _, numrecords, headerlen, recordlen) = struct.unpack_from('<BBBBLHH', buffer, 0)
+    language_driver = buffer[29]
+
+    try:
+        encoding = guess_encoding(language_driver)
+    except LookupError:
+        encoding = 'ascii'
+
+    fields = []
+    offset = HEADER_SIZE
+    record_offset = 1
+    while offset + FIELD_SIZE <= headerlen and buffer[offset] not in (0x0D, 0x0A):
+        name, field_type, _, length, decimal_count = struct.unpack_from('<11scLBB', buffer, offset)
+        field_type = field_type.decode('ascii')
+
+        # For character fields > 255 bytes the high byte is stored in decimal_count
+        if field_type == 'C':
+            length |= decimal_count << 8
+            decimal_count = 0
+
+        name = bytes(name).split(b'\0')[0].decode(encoding)
+        fields.append(DBFField(name, field_type, length, decimal_count, record_offset))
+        offset += FIELD_SIZE
+        record_offset += length
+
+    return DBFHeader(dbversion, numrecords, headerlen, recordlen, encoding, fields)
+
+
+def select_fields(header: DBFHeader, columns: list[str] | None = None) -> list[DBFField]:
+    """Fields of the table that are in columns (all of them if columns is None), in table order"""
+    if columns is None:
+        return list(header.fields)
+    wanted = set(columns)
+    return [field for field in header.fields if field.name in wanted]
+
+
+def record_dtype(header: DBFHeader, fields: list[DBFField]) -> np.dtype:
+    """Structured dtype of one record exposing the deletion flag and only the given fields as raw bytes"""
+    names = ['_flag'] + [field.name for field in fields]
+    formats = ['S1'] + [f'S{field.length}' for field in fields]
+    offsets = [0] + [field.offset for field in fields]
+    return np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': header.recordlen})
+
+
+def map_records(header: DBFHeader, buffer, fields: list[DBFField], offset: int = None) -> np.ndarray:
+    """Zero-copy view of the record area of buffer, up to the end of file marker"""
+    offset = header.headerlen if offset is None else offset
+    dtype = record_dtype(header, fields)
+    count = (len(buffer) - offset) // dtype.itemsize
+    records = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+
+    # 0x1A marks the end of the records
+    eof = np.flatnonzero(records['_flag'] == b'\x1a')
+    if len(eof) > 0:
+        records = records[:eof[0]]
+
+    return records
+
+
+def _decode_text(raw: np.ndarray, encoding: str) -> np.ndarray:
+    # Decode each distinct value once, SAI tables repeat codes and names a lot
+    raw = np.char.rstrip(raw, b'\0 ')
+    values, inverse = np.unique(raw, return_inverse=True)
+    decoded = np.empty(len(values), dtype=object)
+    decoded[:] = [value.decode(encoding) for value in values.tolist()]
+    return decoded[inverse.reshape(-1)]
+
+
+def _decode_number(raw: np.ndarray, field: DBFField) -> np.ndarray:
+    # In some files * is used for padding
+    raw = np.char.strip(np.char.strip(raw), b'*')
+    empty = raw == b''
+
+    if empty.all():
+        return np.full(len(raw), None, dtype=object)
+
+    # Same as dbfread: whole numbers stay int unless the field has empty values
+    if field.type == 'N' and not empty.any():
+        try:
+            return raw.astype(np.int64)
+        except ValueError:
+            pass
+
+    raw = np.where(empty, b'nan', np.char.replace(raw, b',', b'.'))
+    return raw.astype(np.float64)
+
+
+def _decode_date(raw: np.ndarray) -> np.ndarray:
+    digits = np.ascontiguousarray(raw).view(np.uint8).reshape(-1, 8).astype(np.int64) - ord('0')
+    valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+
+    # A date containing only spaces and/or zeros is a NULL value
+    empty = np.char.strip(raw, b' 0') == b''
+
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 4] * 10 + digits[:, 5]
+    day = digits[:, 6] * 10 + digits[:, 7]
+    valid &= (year > 0) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+
+    year = np.where(valid, year, 1970)
+    month = np.where(valid, month, 1)
+    day = np.where(valid, day, 1)
+
+    months = (year - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (month - 1)
+    dates = months.astype('datetime64[D]') + (day - 1)
+    # Days out of the month range (e.g. 20250231) spill into the next month
+    valid &= dates.astype('datetime64[M]') == months
+
+    invalid = ~valid & ~empty
+    if invalid.any():
+        raise ValueError(f'invalid date {raw[invalid][0]!r}')
+
+    dates[~valid] = np.datetime64('NaT')
+    return dates.astype(object)
+
+
+def _decode_logical(raw: np.ndarray) -> np.ndarray:
+    true = np.isin(raw, [b'T', b't', b'Y', b'y'])
+    false = np.isin(raw, [b'F', b'f', b'N', b'n'])
+    null = np.isin(raw, [b'?', b' ', b''])
+
+    if not (true | false | null).all():
+        raise ValueError(f'Illegal value for logical field: {raw[~(true | false | null)][0]!r}')
+
+    if not null.any():
+        return true
+
+    values = np.full(len(raw), None, dtype=object)
+    values[true] = True
+    values[false] = False
+    return values
+
+
+class _ParserTable(NamedTuple):
+    header: DBFHeader
+    char_decode_errors: str = 'strict'
+
+    @property
+    def encoding(self) -> str:
+        return self.header.encoding
+
+
+class _ParserField(NamedTuple):
+    type: str
+    length: int
+
+
+def decode_field(field: DBFField, raw: np.ndarray, header: DBFHeader) -> np.ndarray:
+    """Decode one raw field column (fixed-width bytes) into a typed array"""
+    if field.type in 'CV':
+        return _decode_text(raw, header.encoding)
+    elif field.type in 'NF':
+        return _decode_number(raw, field)
+    elif field.type == 'D':
+        return _decode_date(raw)
+    elif field.type == 'L':
+        return _decode_logical(raw)
+    elif field.type in 'I+':
+        return np.ascontiguousarray(raw).view('<i4').astype(np.int64)
+    elif field.type == 'O':
+        return np.ascontiguousarray(raw).view('<f8').astype(np.float64)
+
+    # Rare types (timestamps, currency, ...) go value by value through dbfread
+    parser = FieldParser(_ParserTable(header))
+    dbf_field = _ParserField(field.type, field.length)
+    values = np.empty(len(raw), dtype=object)
+    values[:] = [parser.parse(dbf_field, value.ljust(field.length, b'\0')) for value in raw.tolist()]
+    return values
+
+
+# Row predicates are (column, op, value) tuples, combined with AND
+FILTER_OPS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+def _filter_values(op: str, value) -> list:
+    if op in ('in', 'not in'):
+        return list(value)
+    return [value]
+
+
+def _encode_date(value) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return pd.Timestamp(value).strftime('%Y%m%d').encode('ascii')
+
+
+def evaluate_filter(field: DBFField, raw: np.ndarray, op: str, value, header: DBFHeader) -> np.ndarray:
+    """Boolean mask of the raw values of field that satisfy the predicate"""
+    if op not in FILTER_OPS and op not in ('in', 'not in'):
+        raise ValueError(f'Unknown filter operator: {op!r}')
+
+    if field.type in 'CVD':
+        # Text and dates are compared as raw bytes, nothing gets decoded
+        if field.type == 'D':
+            values = [_encode_date(v) for v in _filter_values(op, value)]
+            null = np.char.strip(raw, b' 0') == b''
+        else:
+            raw = np.char.rstrip(raw, b'\0 ')
+            values = [v.encode(header.encoding) for v in _filter_values(op, value)]
+            null = np.zeros(len(raw), dtype=bool)
+
+        if op in ('in', 'not in'):
+            mask = np.isin(raw, np.array(values, dtype=raw.dtype))
+            return ~mask if op == 'not in' else mask & ~null
+
+        mask = FILTER_OPS[op](raw, values[0])
+        # Same as NaN in pandas: empty dates only pass !=
+        return mask | null if op == '!=' else mask & ~null
+
+    decoded = pd.Series(decode_field(field, raw, header))
+    if op == 'in':
+        return decoded.isin(value).to_numpy()
+    elif op == 'not in':
+        return ~decoded.isin(value).to_numpy()
+    return FILTER_OPS[op](decoded, value).to_numpy(dtype=bool)
+
+
+def _needs_memo_file(header: DBFHeader, fields: list[DBFField]) -> bool:
+    field_types = {field.type for field in fields}
+    if field_types & set(MEMO_TYPES):
+        return True
+    # dBase uses B for memo indexes, Visual FoxPro for doubles
+    return 'B' in field_types and header.dbversion not in (0x30, 0x31, 0x32)
+
+
+def _filter_dataframe(df: pd.DataFrame, filters: list[tuple]) -> pd.DataFrame:
+    for column, op, value in filters:
+        if op == 'in':
+            df = df[df[column].isin(value)]
+        elif op == 'not in':
+            df = df[~df[column].isin(value)]
+        else:
+            df = df[FILTER_OPS[op](df[column], value)]
+    return df.reset_index(drop=True)
+
+
+def filter_fields(header: DBFHeader, filters: list[tuple]) -> list[DBFField]:
+    """Fields referenced by filters, raises KeyError for columns the table does not have"""
+    fields_by_name = {field.name: field for field in header.fields}
+    for column, _, _ in filters:
+        if column not in fields_by_name:
+            raise KeyError(f'Unknown filter column: {column!r}')
+    return [fields_by_name[name] for name in dict.fromkeys(column for column, _, _ in filters)]
+
+
+def decode_records(header: DBFHeader, records: np.ndarray, fields: list[DBFField], filters: list[tuple]) -> dict[str, np.ndarray]:
+    """Apply filters to the live records and decode fields of the rows that pass"""
+    fields_by_name = {field.name: field for field in header.fields}
+    rows = np.flatnonzero(records['_flag'] == b' ')
+
+    for column, op, value in filters:
+        field = fields_by_name[column]
+        rows = rows[evaluate_filter(field, records[column][rows], op, value, header)]
+
+    data = {}
+    for field in fields:
+        data[field.name] = decode_field(field, records[field.name][rows], header)
+
+    return data
+
+
+def concat_columns(parts: list[dict[str, np.ndarray]], fields: list[DBFField]) -> dict[str, np.ndarray]:
+    """Join the columns decoded from consecutive record ranges"""
+    if len(parts) == 1:
+        return parts[0]
+
+    data = {}
+    for field in fields:
+        # Ranges without live records say nothing about the dtype
+        arrays = [part[field.name] for part in parts if len(part[field.name])] or [parts[0][field.name]]
+        # A range where a numeric field is always empty decodes as None,
+        # the whole table would decode it as NaN
+        if field.type in 'NF' and any(array.dtype != object for array in arrays):
+            arrays = [array.astype(np.float64) if array.dtype == object else array for array in arrays]
+        data[field.name] = np.concatenate(arrays) if arrays else np.empty(0, dtype=object)
+
+    return data
+
+
+def to_dataframe(data: dict[str, np.ndarray], fields: list[DBFField]) -> pd.DataFrame:
+    length = len(data[fields[0].name]) if fields else 0
+    return pd.DataFrame(data, index=pd.RangeIndex(length), columns=[field.name for field in fields], copy=False)
+
+
+def read_dbf(source, columns: list[str] | None = None, filters: list[tuple] | None = None, processes: int | None = None) -> pd.DataFrame:
+    """Read a .dbf from a path or from a bytes-like buffer into a DataFrame.
+
+    Only the fields in columns are decoded, the rest of every record is never touched.
+    filters is a list of (column, op, value) predicates evaluated on the raw records,
+    rows that fail any of them are never decoded. op is one of ==, !=, <, <=, >, >=, in, not in.
+    With processes, paths with at least ERP_PARALLEL_MIN_RECORDS records are decoded
+    in that many record ranges on the worker pool.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        buffer = _map_file(source) if ERP_MMAP else None
+        if buffer is not None:
+            try:
+                return _read_buffer(source, buffer, columns, filters, processes)
+            finally:
+                _close_map(buffer)
+
+        with open(source, 'rb') as f:
+            buffer = f.read()
+    else:
+        buffer = source
+        processes = None
+
+    return _read_buffer(source, buffer, columns, filters, processes)
+
+
+def _map_file(path) -> mmap.mmap | None:
+    """Read-only map of a local .dbf, pages come straight from the OS page cache"""
+    with open(path, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # Empty files, or file systems that can't be mapped
+            return None
+
+
+def _close_map(buffer: mmap.mmap) -> None:
+    # Decoded columns never point into the map, only leftover record views could
+    try:
+        buffer.close()
+    except BufferError:
+        # Closed when the last view is garbage collected
+        pass
+
+
+def _read_buffer(source, buffer, columns: list[str] | None, filters: list[tuple] | None, processes: int | None = None) -> pd.DataFrame:
+    filters = filters or []
+    header = parse_header(buffer)
+    fields = select_fields(header, columns)
+    where_fields = filter_fields(header, filters)
+
+    if _needs_memo_file(header, fields + where_fields):
+        if isinstance(source, (str, os.PathLike)):
+            # Memo fields live in a separate .fpt/.dbt file, let dbfread resolve it
+            df = _filter_dataframe(pd.DataFrame(iter(DBF(source))), filters)
+            return df[[field.name for field in fields]]
+        raise ValueError('Tables with memo fields must be read from a path')
+
+    exposed = fields + [field for field in where_fields if field not in fields]
+    records = map_records(header, buffer, exposed)
+
+    if processes and processes > 1 and len(records) >= ERP_PARALLEL_MIN_RECORDS:
+        try:
+            data = _decode_parallel(source, bytes(buffer[:header.headerlen]), len(records), columns, filters, processes)
+            return to_dataframe(concat_columns(data, fields), fields)
+        except BrokenProcessPool:
+            # A worker died, later reads get a new pool
+            _reset_pool()
+        except (TableChanged, OSError):
+            # Decode what is already mapped in this process
+            pass
+
+    return to_dataframe(decode_records(header, records, fields, filters), fields)
+
+
+class TableChanged(Exception):
+    """The file was replaced while its record ranges were being decoded"""
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(processes: int) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, forking a server process with running threads can deadlock the children
+            _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _decode_range(path, expected_header: bytes, columns: list[str] | None, filters: list[tuple], start: int, stop: int) -> dict[str, np.ndarray]:
+    """Worker: decode records start to stop of a .dbf, reading only their bytes"""
+    with open(path, 'rb') as f:
+        header_bytes = f.read(len(expected_header))
+        if header_bytes != expected_header:
+            raise TableChanged(path)
+        header = parse_header(header_bytes)
+        f.seek(header.headerlen + start * header.recordlen)
+        buffer = f.read((stop - start) * header.recordlen)
+
+    fields = select_fields(header, columns)
+    where_fields = filter_fields(header, filters)
+    exposed = fields + [field for field in where_fields if field not in fields]
+    records = map_records(header, buffer, exposed, offset=0)
+
+    return decode_records(header, records, fields, filters)
+
+
+def _decode_parallel(path, header_bytes: bytes, count: int, columns: list[str] | None, filters: list[tuple], processes: int) -> list[dict[str, np.ndarray]]:
+    """Decode the first count records of path in processes consecutive ranges"""
+    size = math.ceil(count / processes)
+    pool = _get_pool(processes)
+    futures = [pool.submit(_decode_range, path, header_bytes, columns, filters, start, min(start + size, count))
+               for start in range(0, count, size)]
+    return [future.result() for future in futures]
+
+
+def iter_dbf_chunks(path, columns: list[str] | None = None, filters: list[tuple] | None = None, chunk_records: int = 250000) -> Iterator[pd.DataFrame]:
+    """Yield a .dbf as DataFrames of at most chunk_records records.
+
+    Only the bytes of one batch are read at a time, memory does not grow with the table.
+    """
+    filters = filters or []
+    with open(path, 'rb') as f:
+        header_bytes = f.read(HEADER_SIZE)
+        header_bytes += f.read(struct.unpack_from('<H', header_bytes, 8)[0] - HEADER_SIZE)
+        header = parse_header(header_bytes)
+        fields = select_fields(header, columns)
+        where_fields = filter_fields(header, filters)
+
+        if _needs_memo_file(header, fields + where_fields):
+            yield read_dbf(path, columns, filters)
+            return
+
+        exposed = fields + [field for field in where_fields if field not in fields]
+        while True:
+            buffer = f.read(chunk_records * header.recordlen)
+            records = map_records(header, buffer, exposed, offset=0)
+            if len(records) > 0:
+                yield to_dataframe(decode_records(header, records, fields, filters), fields)
+            # A short batch means the end of file or its marker
+            if len(records) < chunk_records:
+                return
+
+
+class DBFStreamDecoder:
+    """Decode a .dbf fed in arbitrary byte chunks, e.g. from an HTTP response.
+
+    Only the bytes of the last incomplete record are buffered between chunks,
+    every complete record is filtered and decoded as soon as it arrives.
+    """
+
+    def __init__(self, columns: list[str] | None = None, filters: list[tuple] | None = None):
+        self.columns = columns
+        self.filters = filters or []
+        self.header = None
+        self.fields = None
+        self._exposed = None
+        self._buffer = bytearray()
+        self._parts = []
+        self._done = False
+
+    def feed(self, chunk: bytes) -> None:
+        if self._done:
+            return
+        self._buffer += chunk
+
+        if self.header is None:
+            if len(self._buffer) < HEADER_SIZE:
+                return
+            headerlen = struct.unpack_from('<H', self._buffer, 8)[0]
+            if len(self._buffer) < headerlen:
+                return
+            self._read_header()
+            del self._buffer[:self.header.headerlen]
+
+        consumed = self._decode_buffer()
+        del self._buffer[:consumed]
+
+    def _read_header(self) -> None:
+        self.header = parse_header(bytes(self._buffer))
+        self.fields = select_fields(self.header, self.columns)
+        where_fields = filter_fields(self.header, self.filters)
+
+        if _needs_memo_file(self.header, self.fields + where_fields):
+            raise ValueError('Tables with memo fields must be read from a path')
+
+        self._exposed = self.fields + [field for field in where_fields if field not in self.fields]
+
+    def _decode_buffer(self) -> int:
+        count = len(self._buffer) // self.header.recordlen
+        if count == 0:
+            return 0
+
+        records = map_records(self.header, self._buffer, self._exposed, offset=0)
+        if len(records) < count:
+            # Reached the end of file marker, anything after it is ignored
+            self._done = True
+
+        self._parts.append(decode_records(self.header, records, self.fields, self.filters))
+        return count * self.header.recordlen
+
+    def finish(self) -> pd.DataFrame:
+        if self.header is None:
+            raise ValueError('Incomplete DBF header')
+        if not self._parts:
+            self._parts.append(decode_records(self.header, map_records(self.header, b'', self._exposed, offset=0), self.fields, self.filters))
+        return to_dataframe(concat_columns(self._parts, self.fields), self.fields)
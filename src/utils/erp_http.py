@@ -0,0 +1,125 @@
+""" STREAMING DOWNLOAD OF REMOTE ERP TABLES
+
+    Tables are decoded while they download, so memory stays bounded by the decoded
+    columns plus one chunk. Interrupted transfers resume with an HTTP Range request.
+
+    All requests go through one keep-alive connection pool of ERP_MAX_CONNECTIONS
+    connections. Each thread gets its own Session mounted on that shared adapter,
+    so cookies and headers are never mutated from two threads at once.
+"""
+import threading
+import requests
+import pandas as pd
+
+from typing import Iterator
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.config import (ERP_CONNECT_TIMEOUT, ERP_READ_TIMEOUT, ERP_CHUNK_SIZE, ERP_MAX_RESUMES,
+                        ERP_MAX_CONNECTIONS, ERP_RETRIES, ERP_RETRY_BACKOFF)
+from src.utils.dbf_reader import DBFStreamDecoder
+
+_adapter = None
+_adapter_lock = threading.Lock()
+_local = threading.local()
+
+
+class RemoteTableChanged(Exception):
+    """The remote file changed while it was being downloaded"""
+
+
+def _get_adapter() -> HTTPAdapter:
+    global _adapter
+    with _adapter_lock:
+        if _adapter is None:
+            retry = Retry(total=ERP_RETRIES,
+                          backoff_factor=ERP_RETRY_BACKOFF,
+                          status_forcelist=[429, 500, 502, 503, 504],
+                          allowed_methods=['GET'],
+                          # The last failed response is returned and raised by raise_for_status
+                          raise_on_status=False)
+            # pool_block makes extra threads wait for a connection instead of opening new ones
+            _adapter = HTTPAdapter(pool_maxsize=ERP_MAX_CONNECTIONS, pool_block=True, max_retries=retry)
+        return _adapter
+
+
+def get_session() -> requests.Session:
+    """Session of the current thread, sharing the ERP connection pool"""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = _get_adapter()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _local.session = session
+    return session
+
+
+def get_remote(url: str, headers: dict | None = None) -> requests.Response:
+    """Open a streamed GET to the ERP file server, error responses are raised"""
+    response = get_session().get(url, headers=headers or {}, stream=True,
+                                 timeout=(ERP_CONNECT_TIMEOUT, ERP_READ_TIMEOUT))
+    if not response.ok:
+        # Give the connection back to the pool before raising
+        response.close()
+        response.raise_for_status()
+    return response
+
+
+def response_validator(response: requests.Response) -> str | None:
+    return response.headers.get('ETag') or response.headers.get('Last-Modified')
+
+
+def iter_remote_chunks(url: str, start: int = 0, response: requests.Response | None = None) -> Iterator[bytes]:
+    """Yield the bytes of url from start, resuming the transfer when the connection drops.
+
+    response is an already open response positioned at start, e.g. from a conditional request.
+    """
+    received = start
+    validator = response_validator(response) if response is not None else None
+    resumes = 0
+
+    while True:
+        try:
+            if response is None:
+                headers = {}
+                if received > 0:
+                    headers['Range'] = f'bytes={received}-'
+                    if validator:
+                        # Only resume if the file is still the same one
+                        headers['If-Range'] = validator
+
+                response = get_remote(url, headers)
+
+                if received > 0 and response.status_code != 206:
+                    response.close()
+                    raise RemoteTableChanged(f'{url} changed or does not support ranges')
+                if validator is None:
+                    validator = response_validator(response)
+
+            with response:
+                for chunk in response.iter_content(chunk_size=ERP_CHUNK_SIZE):
+                    received += len(chunk)
+                    yield chunk
+            return
+
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+            response = None
+            resumes += 1
+            if resumes > ERP_MAX_RESUMES:
+                raise
+
+
+def stream_dbf(url: str, columns: list[str] | None = None, filters: list[tuple] | None = None) -> pd.DataFrame:
+    """Download and decode a remote .dbf chunk by chunk"""
+    for _ in range(ERP_MAX_RESUMES + 1):
+        decoder = DBFStreamDecoder(columns=columns, filters=filters)
+        try:
+            for chunk in iter_remote_chunks(url):
+                decoder.feed(chunk)
+            return decoder.finish()
+        except RemoteTableChanged:
+            # Start over, records already decoded may belong to the old file
+            continue
+
+    raise RemoteTableChanged(f'{url} kept changing during download')
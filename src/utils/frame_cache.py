@@ -0,0 +1,38 @@
+""" SHARED READ-ONLY FRAMES
+
+    The loaders of src/data build their frames once per server process with
+    st.cache_resource instead of st.cache_data, which pickles the result and
+    unpickles a full copy on every call. Every call gets a shallow copy of the
+    cached frame, which shares its data.
+
+    Copy-on-write must be enabled for the whole process, app.py does it before
+    any frame is built: a caller can drop, rename, reindex or assign columns on
+    its frame, and the cached one stays the same. Data is only copied by pandas
+    when it is actually modified.
+"""
+import functools
+import pandas as pd
+import streamlit as st
+
+
+def frame_view(value):
+    """Shallow copy of a cached frame, other values as they are"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    return value
+
+
+def shared_frame(func):
+    """Cache the frame returned by func once per arguments, handing out views of it"""
+    cached = st.cache_resource(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Without it callers would modify the cached frame through their views
+        assert pd.options.mode.copy_on_write, 'Copy-on-write must be enabled before loading frames'
+        return frame_view(cached(*args, **kwargs))
+
+    wrapper.clear = cached.clear
+    # func itself, to build a frame that isn't kept in the cache
+    wrapper.uncached = func
+    return wrapper
@@ -0,0 +1,157 @@
+""" DECODED TABLES SHARED BETWEEN PROCESSES
+
+    With several Streamlit processes on a host, the process that loads a table
+    publishes it in ERP_SHARED_DIR as an uncompressed Arrow IPC file, and the
+    others memory-map that file instead of fetching and decoding the table
+    again. The page cache holds a single copy of its columns for every process.
+
+        ERP_SHARED_DIR/<table>/<version>-<fields>.arrow   published versions
+        ERP_SHARED_DIR/<table>/current.json               version being served
+        ERP_SHARED_DIR/<table>.lock                       held while loading
+
+    Loading or refreshing a table is done under its lock, created with O_EXCL,
+    so exactly one process fetches and decodes each version while the others
+    wait for it and map the result. The modification time of current.json is
+    the last time a process checked the table source.
+"""
+import os
+import json
+import time
+import hashlib
+import tempfile
+import pandas as pd
+import pyarrow as pa
+
+from contextlib import contextmanager
+from typing import Iterator
+
+from src.config import ERP_SHARED_DIR, ERP_SHARED_LOCK_SECONDS
+from src.data.schemas import STRING, share_categories
+from src.utils.table_cache import replace_file
+
+POINTER = 'current.json'
+# Seconds between checks of a lock held by another process
+LOCK_POLL_SECONDS = 0.2
+
+
+def _table_dir(table_name: str) -> str:
+    return os.path.join(ERP_SHARED_DIR, table_name)
+
+
+def _file_name(version: str, fields: frozenset | None) -> str:
+    key = '*' if fields is None else ','.join(sorted(fields))
+    return f'{version}-{hashlib.sha1(key.encode()).hexdigest()[:8]}.arrow'
+
+
+def read_pointer(table_name: str) -> dict | None:
+    """Version, fields and file of the published table_name, plus 'checked', when its source was last checked"""
+    path = os.path.join(_table_dir(table_name), POINTER)
+    try:
+        with open(path, encoding='utf-8') as f:
+            pointer = json.load(f)
+        pointer['checked'] = os.stat(path).st_mtime
+    except (OSError, ValueError):
+        return None
+    return pointer
+
+
+def mark_checked(table_name: str) -> None:
+    """Record that the source of the published table_name was checked and hasn't changed"""
+    try:
+        os.utime(os.path.join(_table_dir(table_name), POINTER))
+    except OSError:
+        pass
+
+
+def map_table(table_name: str, pointer: dict) -> pd.DataFrame | None:
+    """Published frame of pointer, memory-mapped. None when it was already removed"""
+    try:
+        source = pa.memory_map(os.path.join(_table_dir(table_name), pointer['file']), 'r')
+        table = pa.ipc.open_file(source).read_all()
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+    # Strings stay in the mapped buffers, like apply_schema they are Arrow strings
+    df = table.to_pandas(types_mapper={pa.string(): STRING, pa.large_string(): STRING}.get, split_blocks=True)
+    # Codes come back as dictionaries with their own categories
+    return share_categories(df)
+
+
+def publish(table_name: str, version: str, fields: frozenset | None, df: pd.DataFrame) -> bool:
+    """Publish df as the version of table_name served to every process. False when it can't be stored as Arrow"""
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Fields outside the schemas may hold mixed values
+        return False
+
+    table_dir = _table_dir(table_name)
+    os.makedirs(table_dir, exist_ok=True)
+    file_name = _file_name(version, fields)
+
+    fd, tmp_path = tempfile.mkstemp(dir=table_dir, suffix='.arrow.part')
+    try:
+        with os.fdopen(fd, 'wb') as f, pa.ipc.new_file(f, table.schema) as writer:
+            writer.write_table(table)
+        replace_file(tmp_path, os.path.join(table_dir, file_name))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    fd, tmp_path = tempfile.mkstemp(dir=table_dir, suffix='.json.part')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({'version': version, 'fields': None if fields is None else sorted(fields), 'file': file_name}, f)
+    replace_file(tmp_path, os.path.join(table_dir, POINTER))
+
+    for old in os.listdir(table_dir):
+        if old.endswith('.arrow') and old != file_name:
+            try:
+                os.remove(os.path.join(table_dir, old))
+            except OSError:
+                # Still mapped by a process on Windows, removed by a later publish
+                pass
+    return True
+
+
+def _try_lock(path: str) -> bool:
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, 'w') as f:
+        f.write(str(os.getpid()))
+    return True
+
+
+@contextmanager
+def table_lock(table_name: str) -> Iterator[bool]:
+    """Hold the lock of table_name. Yields False, without the lock, when another
+    process held it: that process has just loaded the table."""
+    os.makedirs(ERP_SHARED_DIR, exist_ok=True)
+    path = os.path.join(ERP_SHARED_DIR, f'{table_name}.lock')
+
+    while not _try_lock(path):
+        try:
+            stale = time.time() - os.stat(path).st_mtime > ERP_SHARED_LOCK_SECONDS
+        except FileNotFoundError:
+            stale = False
+        if stale:
+            # Left by a process that died while loading
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+
+        time.sleep(LOCK_POLL_SECONDS)
+        if not os.path.exists(path):
+            yield False
+            return
+
+    try:
+        yield True
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
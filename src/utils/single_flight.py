@@ -0,0 +1,74 @@
+""" SINGLE-FLIGHT CALLS
+
+    Concurrent calls of a decorated function with the same arguments, e.g. the
+    sessions that open the same month right after a refresh, run it once: the
+    first caller computes the result and the others wait for it and share it.
+    Nothing is kept once the call returns, caching is left to the loaders of
+    src/data (Streamlit already runs a cached loader once per key, and
+    table_store decodes a table once).
+
+    Every caller gets its own view of a shared frame (see frame_cache.py).
+"""
+import functools
+import threading
+
+from src.utils.frame_cache import frame_view
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _freeze(value):
+    """Hashable key of an argument, lists of classes or agents included"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def single_flight(func):
+    """Share the result of func between concurrent calls with the same arguments"""
+    lock = threading.Lock()
+    calls: dict[tuple, _Call] = {}
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (_freeze(args), _freeze(kwargs))
+        try:
+            hash(key)
+        except TypeError:
+            # Frames or other unhashable arguments, nothing to share
+            return func(*args, **kwargs)
+
+        with lock:
+            call = calls.get(key)
+            leader = call is None
+            if leader:
+                call = calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return frame_view(call.result)
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with lock:
+                del calls[key]
+            call.done.set()
+        # The leader gets a view too, the shared frame is never handed out
+        return frame_view(call.result)
+
+    return wrapper
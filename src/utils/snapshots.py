@@ -0,0 +1,188 @@
+""" PARQUET SNAPSHOTS OF ERP TABLES
+
+    A loaded table is written once per version of its source .dbf files as a
+    Parquet dataset partitioned by the year and month of a document date:
+
+        ERP_SNAPSHOT_DIR/<name>/<version>/YEAR=2025/MONTH=3/part-0.parquet
+
+    Later loads for a date range only open the partitions of the months in the
+    range. Rows without a date land in the YEAR=__HIVE_DEFAULT_PARTITION__
+    partition and are only read through the include predicate.
+
+    include is a (column, op, value) predicate like the load_dbf filters, for
+    rows needed whatever their date, e.g. open orders.
+"""
+import os
+import json
+import logging
+import shutil
+import hashlib
+import tempfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from typing import Callable
+
+from src.config import ERP_SNAPSHOT_DIR
+from src.utils.table_store import table_version
+from src.data.schemas import STRING, share_categories
+
+# Part of every snapshot version, bump it when a loader changes the columns it builds
+SNAPSHOT_FORMAT = '4'
+PARTITIONING = ds.partitioning(pa.schema([('YEAR', pa.int16()), ('MONTH', pa.int8())]), flavor='hive')
+ROW_COL = '_ROW'
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_version(tables: list[str]) -> str | None:
+    versions = [table_version(table) for table in tables]
+    if None in versions:
+        return None
+    return hashlib.sha1('|'.join([SNAPSHOT_FORMAT] + versions).encode()).hexdigest()[:16]
+
+
+def months_between(start_date: pd.Timestamp, end_date: pd.Timestamp) -> list[tuple[int, int]]:
+    """(year, month) of every month from start_date to end_date"""
+    periods = pd.period_range(pd.Timestamp(start_date).to_period('M'), pd.Timestamp(end_date).to_period('M'), freq='M')
+    return [(period.year, period.month) for period in periods]
+
+
+def _month_filter(months: list[tuple[int, int]]) -> ds.Expression:
+    expression = pc.scalar(False)
+    for year, month in months:
+        expression = expression | ((ds.field('YEAR') == year) & (ds.field('MONTH') == month))
+    return expression
+
+
+def _include_expression(include: tuple) -> ds.Expression:
+    column, op, value = include
+    field = ds.field(column)
+    return {
+        '==': lambda: field == value,
+        '!=': lambda: field != value,
+        'in': lambda: field.isin(value),
+        'not in': lambda: ~field.isin(value),
+    }[op]()
+
+
+def _include_mask(df: pd.DataFrame, include: tuple) -> pd.Series:
+    column, op, value = include
+    return {
+        '==': lambda: df[column] == value,
+        '!=': lambda: df[column] != value,
+        'in': lambda: df[column].isin(value),
+        'not in': lambda: ~df[column].isin(value),
+    }[op]()
+
+
+def write_snapshot(name: str, version: str, df: pd.DataFrame, date_col: str) -> bool:
+    """Write df partitioned by the year and month of date_col, replacing older versions of the snapshot.
+    False when it can't be stored as Parquet"""
+    target = os.path.join(ERP_SNAPSHOT_DIR, name, version)
+    if os.path.exists(target):
+        return True
+
+    index_names = [n for n in df.index.names if n is not None]
+    data = df.reset_index() if index_names else df.reset_index(drop=True)
+    dates = pd.to_datetime(data[date_col], errors='coerce')
+    data[ROW_COL] = range(len(data))
+    data['YEAR'] = dates.dt.year.astype('Int16')
+    data['MONTH'] = dates.dt.month.astype('Int8')
+
+    try:
+        table = pa.Table.from_pandas(data, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        # Fields outside the schemas may hold mixed values
+        logger.warning('Snapshot of %s not written, it is served from memory: %s', name, e)
+        return False
+    table = table.replace_schema_metadata({**table.schema.metadata, b'erp_index': json.dumps(index_names).encode()})
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(target), prefix='.part-')
+    try:
+        ds.write_dataset(table, tmp_dir, format='parquet', partitioning=PARTITIONING,
+                         existing_data_behavior='overwrite_or_ignore')
+        os.replace(tmp_dir, target)
+    except OSError:
+        # Another session wrote the same version first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.exists(target):
+            raise
+
+    for old in os.listdir(os.path.dirname(target)):
+        if old != version and not old.startswith('.'):
+            shutil.rmtree(os.path.join(os.path.dirname(target), old), ignore_errors=True)
+    return True
+
+
+def read_snapshot(name: str, version: str, start_date=None, end_date=None, include: tuple | None = None) -> pd.DataFrame | None:
+    """Rows of the months from start_date to end_date, plus the rows matching include"""
+    path = os.path.join(ERP_SNAPSHOT_DIR, name, version)
+    if not os.path.exists(path):
+        return None
+
+    dataset = ds.dataset(path, format='parquet', partitioning=PARTITIONING)
+    expression = pc.scalar(True)
+    if start_date is not None and end_date is not None:
+        expression = _month_filter(months_between(start_date, end_date))
+        if include is not None:
+            expression = expression | _include_expression(include)
+    elif include is not None:
+        expression = _include_expression(include)
+
+    table = dataset.to_table(filter=expression)
+    index_names = json.loads(dataset.schema.metadata[b'erp_index'])
+
+    # Parquet has no pandas string dtype, read strings back as Arrow strings like apply_schema
+    df = table.to_pandas(types_mapper={pa.string(): STRING, pa.large_string(): STRING}.get)
+    # Codes come back as Parquet dictionaries with their own categories, or as plain values
+    df = share_categories(df)
+    df = df.sort_values(ROW_COL).drop(columns=['YEAR', 'MONTH'])
+    if index_names:
+        return df.drop(columns=ROW_COL).set_index(index_names)
+    # Same row labels as slicing the loaded table
+    return df.set_index(ROW_COL).rename_axis(None)
+
+
+def _slice(df: pd.DataFrame, date_col: str, start_date, end_date, include: tuple | None) -> pd.DataFrame:
+    """In memory equivalent of read_snapshot"""
+    mask = pd.Series(True, index=df.index)
+    if start_date is not None and end_date is not None:
+        periods = pd.to_datetime(df[date_col], errors='coerce').dt.to_period('M')
+        mask = periods.between(pd.Timestamp(start_date).to_period('M'), pd.Timestamp(end_date).to_period('M'))
+        if include is not None:
+            mask = mask | _include_mask(df, include)
+    elif include is not None:
+        mask = _include_mask(df, include)
+    return df[mask.to_numpy()]
+
+
+def load_snapshot(name: str,
+                  tables: list[str],
+                  date_col: str,
+                  build: Callable[[], pd.DataFrame],
+                  start_date=None,
+                  end_date=None,
+                  include: tuple | None = None) -> pd.DataFrame:
+    """Rows of a loaded table for the months from start_date to end_date, plus the rows matching include.
+
+    build loads the whole table from tables without caching it, it only runs when they changed since
+    the last snapshot. The rows are then read back from the new snapshot, so the whole table isn't kept.
+    """
+    version = snapshot_version(tables) if ERP_SNAPSHOT_DIR else None
+    if version is not None:
+        df = read_snapshot(name, version, start_date, end_date, include)
+        if df is not None:
+            return df
+
+    df = build()
+    if version is not None and write_snapshot(name, version, df, date_col):
+        rows = read_snapshot(name, version, start_date, end_date, include)
+        # None when a newer version already replaced it
+        if rows is not None:
+            return rows
+
+    return _slice(df, date_col, start_date, end_date, include)
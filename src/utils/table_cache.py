@@ -0,0 +1,260 @@
+""" ON-DISK CACHE OF REMOTE ERP TABLES
+
+    Every downloaded .dbf is kept in ERP_CACHE_DIR next to a .json file with the
+    HTTP validators (ETag / Last-Modified) and the DBF header's last update date
+    and record count. Before a cached copy is reused it is revalidated with a
+    conditional request, or with a 32 byte Range probe of the DBF header when the
+    server sends no validators. Unchanged tables cost one round trip.
+
+    Tables in APPEND_ONLY_TABLES are synced incrementally: the remote header gives
+    the new record count and only the byte range of the appended records is
+    downloaded. The last cached record is downloaded again with them as a check, if
+    it or the field layout changed the whole table is downloaded. In place edits of
+    older records are picked up by the full download forced every ERP_FULL_SYNC_HOURS.
+"""
+import os
+import json
+import time
+import struct
+import logging
+import tempfile
+import requests
+
+from src.config import ERP_CACHE_DIR, APPEND_ONLY_TABLES, ERP_FULL_SYNC_HOURS, ERP_CHUNK_SIZE
+from src.utils.dbf_reader import HEADER_SIZE
+from src.utils.erp_http import get_remote, iter_remote_chunks, response_validator
+
+logger = logging.getLogger(__name__)
+
+
+def cache_paths(table_name: str) -> tuple[str, str]:
+    """Paths of the cached .dbf and of its metadata"""
+    return (os.path.join(ERP_CACHE_DIR, f'{table_name}.dbf'),
+            os.path.join(ERP_CACHE_DIR, f'{table_name}.json'))
+
+
+def read_meta(table_name: str) -> dict | None:
+    path, meta_path = cache_paths(table_name)
+    if not (os.path.exists(path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def header_info(header: bytes) -> dict:
+    """Last update date and record count stored in the first bytes of a .dbf"""
+    year, month, day, numrecords = struct.unpack_from('<BBBL', header, 1)
+    # Same 2-digit year expansion as dbfread
+    year = 2000 + year if year < 80 else 1900 + year
+    return {
+        'dbf_date': f'{year:04d}-{month:02d}-{day:02d}',
+        'numrecords': numrecords,
+    }
+
+
+def read_header(path: str) -> bytes:
+    """Header and field descriptors of a .dbf file"""
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+        headerlen, = struct.unpack_from('<H', header, 8)
+        return header + f.read(headerlen - HEADER_SIZE)
+
+
+def replace_file(src: str, dst: str) -> None:
+    # On Windows the target can't be replaced while a reader has it open
+    for _ in range(10):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            time.sleep(0.1)
+    os.replace(src, dst)
+
+
+def write_meta(table_name: str, meta: dict) -> None:
+    _, meta_path = cache_paths(table_name)
+    fd, tmp_path = tempfile.mkstemp(dir=ERP_CACHE_DIR, suffix='.json.part')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    replace_file(tmp_path, meta_path)
+
+
+def _download(table_name: str, url: str, response: requests.Response | None = None) -> str:
+    """Stream url into the cache and record its validators"""
+    path, _ = cache_paths(table_name)
+    os.makedirs(ERP_CACHE_DIR, exist_ok=True)
+
+    if response is None:
+        response = get_remote(url)
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+
+    fd, tmp_path = tempfile.mkstemp(dir=ERP_CACHE_DIR, suffix='.dbf.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter_remote_chunks(url, response=response):
+                f.write(chunk)
+            size = f.tell()
+
+        header = read_header(tmp_path)
+        replace_file(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    write_meta(table_name, {
+        'url': url,
+        'etag': etag,
+        'last_modified': last_modified,
+        'size': size,
+        'header': header.hex(),
+        'full_sync': time.time(),
+        **header_info(header),
+    })
+    return path
+
+
+def _append_records(table_name: str, url: str, meta: dict, conditional: dict) -> str | None:
+    """Download only the records appended to the remote table since it was cached.
+
+    Returns None when the table changed in some other way and must be downloaded whole.
+    """
+    path, _ = cache_paths(table_name)
+    cached_header = bytes.fromhex(meta['header'])
+    headerlen, recordlen = struct.unpack_from('<HH', cached_header, 8)
+    cached_count = meta['numrecords']
+
+    # The conditional request also fetches the remote header and field descriptors
+    response = get_remote(url, {**conditional, 'Range': f'bytes=0-{headerlen - 1}'})
+    if response.status_code == 304:
+        response.close()
+        return path
+    if response.status_code != 206:
+        # No range support, the response is the whole file
+        return _download(table_name, url, response)
+    with response:
+        header = response.content
+    validator = response_validator(response)
+
+    count = header_info(header)['numrecords'] if len(header) == headerlen else -1
+    # Only the update date and the record count may differ, and records are never removed
+    if header[:1] + header[8:] != cached_header[:1] + cached_header[8:] or count < cached_count:
+        return None
+    if count == cached_count:
+        # Nothing appended. Servers without ETag or Last-Modified never answer 304, records
+        # edited in place are picked up by the full download every ERP_FULL_SYNC_HOURS
+        return path
+
+    # Start one record early, the last cached record must still be the same
+    overlap = 1 if cached_count else 0
+    start = headerlen + (cached_count - overlap) * recordlen
+    end = headerlen + count * recordlen - 1
+    headers = {'Range': f'bytes={start}-{end}'}
+    if validator:
+        headers['If-Range'] = validator
+
+    response = get_remote(url, headers)
+    if response.status_code != 206:
+        # The file changed again since the header was read
+        return _download(table_name, url, response)
+
+    fd, tmp_path = tempfile.mkstemp(dir=ERP_CACHE_DIR, suffix='.dbf.part')
+    try:
+        with os.fdopen(fd, 'wb') as f, open(path, 'rb') as cached, response:
+            f.write(header)
+            cached.seek(headerlen)
+            remaining = (cached_count - overlap) * recordlen
+            while remaining:
+                block = cached.read(min(remaining, ERP_CHUNK_SIZE))
+                if not block:
+                    raise OSError(f'Cached {table_name} is truncated')
+                f.write(block)
+                remaining -= len(block)
+            last_record = cached.read(overlap * recordlen)
+
+            received = b''
+            for chunk in response.iter_content(chunk_size=ERP_CHUNK_SIZE):
+                if len(received) < len(last_record):
+                    received += chunk[:len(last_record) - len(received)]
+                f.write(chunk)
+            # Earlier records were rewritten, or the transfer was cut short
+            appended = received == last_record and f.tell() == end + 1
+            f.write(b'\x1a')
+            size = f.tell()
+
+        if not appended:
+            os.remove(tmp_path)
+            return None
+        replace_file(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    write_meta(table_name, {
+        **meta,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'size': size,
+        'header': header.hex(),
+        **header_info(header),
+    })
+    logger.info('Appended %d records to cached %s', count - cached_count, table_name)
+    return path
+
+
+def _header_unchanged(url: str, meta: dict) -> bool:
+    """Compare the remote DBF header (update date and record count) with the cached one"""
+    with get_remote(url, {'Range': f'bytes=0-{HEADER_SIZE - 1}'}) as response:
+        header = response.raw.read(HEADER_SIZE, decode_content=True)
+
+        if response.status_code == 206:
+            # Content-Range: bytes 0-31/<size>
+            total = response.headers.get('Content-Range', '').rpartition('/')[2]
+            if total.isdigit() and int(total) != meta['size']:
+                return False
+
+    return len(header) == HEADER_SIZE and header_info(header) == header_info(bytes.fromhex(meta['header']))
+
+
+def sync_table(table_name: str, url: str) -> str:
+    """Return the path of an up to date local copy of a remote table, downloading it only if it changed"""
+    path, _ = cache_paths(table_name)
+    meta = read_meta(table_name)
+
+    if meta is None or meta.get('url') != url:
+        return _download(table_name, url)
+
+    try:
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+        if table_name in APPEND_ONLY_TABLES:
+            if time.time() - meta.get('full_sync', 0) > ERP_FULL_SYNC_HOURS * 3600:
+                # The validators describe the remote file, not edits missed by the appends
+                return _download(table_name, url)
+            return _append_records(table_name, url, meta, headers) or _download(table_name, url)
+
+        if headers:
+            response = get_remote(url, headers)
+            if response.status_code == 304:
+                response.close()
+                return path
+            # The table changed, the same response carries the new file
+            return _download(table_name, url, response)
+
+        if _header_unchanged(url, meta):
+            return path
+        return _download(table_name, url)
+
+    except requests.RequestException as e:
+        # Keep working with the last downloaded copy while the ERP server is unreachable
+        logger.warning('Could not revalidate %s, using cached copy: %s', table_name, e)
+        return path
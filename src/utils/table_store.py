@@ -0,0 +1,273 @@
+""" RAW TABLE TIER
+
+    Every ERP table is fetched and decoded once per data version into a frame
+    with the columns declared in src/data/schemas.py, already converted to their
+    dtypes, without filters nor index. load_dbf derives what each src/data
+    loader asks for (columns, filters, index) from this frame, so loaders that
+    read the same table with different columns or flags share one decode.
+
+    The version of a table is the modification time and size of its .dbf (or of
+    its on-disk copy when it's remote). Once loaded, readers get the held frame
+    without checking the source again: refresh_table, run in the background by
+    src/data/refresher.py, decodes a changed table and swaps it in, keeping the
+    last good frame when it fails. Remote tables without on-disk copy have no
+    version, refreshing them always downloads them again.
+
+    Tables only read through their Parquet snapshots (see src/utils/snapshots.py)
+    are never decoded here, the version of their source is recorded instead so
+    refresh_table also finds out when they change. Remote tables that failed to
+    load are tried again by refresh_table too.
+
+    With ERP_SHARED_DIR, loaded tables are also published for the other
+    Streamlit processes of the host (see src/utils/shared_tables.py).
+"""
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+
+from src.config import ERP_CACHE_DIR, ERP_SHARED_DIR, PARALLEL_TABLES, ERP_PARSE_PROCESSES, get_table_conn
+from src.data.schemas import SCHEMAS, apply_schema
+from src.utils import shared_tables
+from src.utils.dbf_reader import FILTER_OPS, read_dbf
+from src.utils.erp_http import stream_dbf
+from src.utils.table_cache import sync_table
+
+_lock = threading.Lock()
+_table_locks: dict[str, threading.Lock] = {}
+# table name -> (version, decoded fields or None for all of them, frame)
+_tables: dict[str, tuple[str | None, frozenset | None, pd.DataFrame]] = {}
+# table name -> version of the source of a table read through its snapshots, not decoded
+_snapshot_sources: dict[str, str] = {}
+# Tables that couldn't be loaded, refresh_table tries them again
+_failed: set[str] = set()
+
+
+def table_source(table_name: str) -> tuple[str, str | None]:
+    """Path (or url) to read table_name from and its version, None when it can't be known without downloading it"""
+    path = get_table_conn(table_name)
+    if path.startswith('http'):
+        if not ERP_CACHE_DIR:
+            return path, None
+        # Revalidate the local copy, only changed tables are downloaded again
+        path = sync_table(table_name, path)
+
+    stat = os.stat(path)
+    return path, f'{stat.st_mtime_ns}-{stat.st_size}'
+
+
+def _covers(decoded: frozenset | None, fields: frozenset | None) -> bool:
+    if decoded is None:
+        return True
+    return fields is not None and fields <= decoded
+
+
+def _table_lock(table_name: str) -> threading.Lock:
+    with _lock:
+        return _table_locks.setdefault(table_name, threading.Lock())
+
+
+def _decode(table_name: str, source: str, fields: frozenset | None) -> pd.DataFrame:
+    projection = None if fields is None else sorted(fields)
+    if source.startswith('http'):
+        # Records are decoded while they download
+        df = stream_dbf(source, columns=projection)
+    else:
+        processes = ERP_PARSE_PROCESSES if table_name in PARALLEL_TABLES else None
+        df = read_dbf(source, columns=projection, processes=processes)
+    return apply_schema(df, table_name)
+
+
+def _union(fields: frozenset | None, other: frozenset | None) -> frozenset | None:
+    return None if fields is None or other is None else fields | other
+
+
+def _pointer_fields(pointer: dict) -> frozenset | None:
+    return None if pointer['fields'] is None else frozenset(pointer['fields'])
+
+
+def _map_published(table_name: str, fields: frozenset | None, newer_than: str | None = None) -> tuple | None:
+    """(version, fields, frame) published by another process, if it holds fields and isn't newer_than"""
+    pointer = shared_tables.read_pointer(table_name)
+    if pointer is None or pointer['version'] == newer_than or not _covers(_pointer_fields(pointer), fields):
+        return None
+    df = shared_tables.map_table(table_name, pointer)
+    return None if df is None else (pointer['version'], _pointer_fields(pointer), df)
+
+
+def _load(table_name: str, fields: frozenset | None, held: str | None = None) -> tuple | None:
+    """(version, fields, frame) of the current version of table_name, None when it's still held"""
+    if not ERP_SHARED_DIR:
+        source, version = table_source(table_name)
+        if version is not None and version == held:
+            return None
+        return version, fields, _decode(table_name, source, fields)
+
+    with shared_tables.table_lock(table_name) as owner:
+        if not owner:
+            # Another process just loaded it
+            published = _map_published(table_name, fields)
+            if published is not None:
+                return None if published[0] == held else published
+
+        source, version = table_source(table_name)
+        pointer = shared_tables.read_pointer(table_name)
+        if pointer is not None and pointer['version'] == version:
+            shared_tables.mark_checked(table_name)
+            if version == held:
+                return None
+            published = _map_published(table_name, fields)
+            if published is not None:
+                return published
+            fields = _union(fields, _pointer_fields(pointer))
+        elif version is not None and version == held:
+            return None
+
+        df = _decode(table_name, source, fields)
+        # Remote tables without on-disk copy have no version to publish them with
+        if version is not None:
+            shared_tables.publish(table_name, version, fields, df)
+        return version, fields, df
+
+
+def get_table(table_name: str, columns: list | None = None) -> pd.DataFrame:
+    """Decoded table_name, shared by every caller so it must not be modified.
+
+    Holds the declared columns of the table plus columns, or every field when columns is None.
+    """
+    fields = None if columns is None else frozenset(SCHEMAS.get(table_name, {})) | frozenset(columns)
+
+    # One decode per table, concurrent callers wait for it
+    with _table_lock(table_name):
+        cached = _tables.get(table_name)
+        if cached is not None and _covers(cached[1], fields):
+            return cached[2]
+
+        if cached is not None:
+            # Columns not declared in the schema, decode them along the ones already held
+            fields = _union(fields, cached[1])
+        # A table another process has loaded is used as is, the refresher keeps it current
+        entry = (_map_published(table_name, fields) if ERP_SHARED_DIR else None) or _load(table_name, fields)
+        _tables[table_name] = entry
+        return entry[2]
+
+
+def loaded_tables() -> list[str]:
+    """Tables decoded here, read through their snapshots, or that failed to load"""
+    with _lock:
+        pending = [table for table in [*_snapshot_sources, *_failed] if table not in _tables]
+        return list(_tables) + list(dict.fromkeys(pending))
+
+
+def mark_failed(table_name: str) -> None:
+    """Record that table_name couldn't be loaded, so refresh_table tries it again"""
+    with _lock:
+        _failed.add(table_name)
+
+
+def table_failed(table_name: str) -> bool:
+    return table_name in _failed
+
+
+def table_version(table_name: str) -> str | None:
+    """Version of the loaded table_name, or of its source when it isn't loaded yet"""
+    cached = _tables.get(table_name)
+    if cached is not None:
+        return cached[0]
+
+    version = table_source(table_name)[1]
+    if version is not None:
+        with _lock:
+            # The first version read, loaders built from it are cleared once it changes
+            _snapshot_sources.setdefault(table_name, version)
+    return version
+
+
+def refresh_table(table_name: str, max_age: float = 0) -> bool:
+    """Load table_name again if its source changed. True when a new version was swapped in.
+
+    With ERP_SHARED_DIR, a source checked by any process in the last max_age seconds isn't checked again.
+    """
+    cached = _tables.get(table_name)
+    if table_name in _failed:
+        if cached is None:
+            # Every field, whatever the loaders that got an empty table asked for
+            get_table(table_name)
+        with _lock:
+            _failed.discard(table_name)
+        # Loaders built while it failed hold an empty table
+        return True
+    if cached is None:
+        return _refresh_source(table_name)
+
+    entry = None
+    pointer = shared_tables.read_pointer(table_name) if ERP_SHARED_DIR else None
+    if pointer is not None and time.time() - pointer['checked'] < max_age:
+        entry = _map_published(table_name, cached[1], newer_than=cached[0])
+    else:
+        # Readers keep getting the held frame while the new version is loaded
+        entry = _load(table_name, cached[1], held=cached[0])
+    if entry is None:
+        return False
+
+    with _table_lock(table_name):
+        current = _tables.get(table_name)
+        if current is not None and current[0] == entry[0] and not _covers(entry[1], current[1]):
+            # A reader already loaded this version with more columns
+            return False
+        _tables[table_name] = entry
+    return True
+
+
+def _refresh_source(table_name: str) -> bool:
+    """True when the source of a table only read through its snapshots changed"""
+    with _lock:
+        held = _snapshot_sources.get(table_name)
+    if held is None:
+        # Not loaded yet, the first reader decodes it
+        return False
+
+    version = table_source(table_name)[1]
+    if version is None or version == held:
+        return False
+    with _lock:
+        _snapshot_sources[table_name] = version
+    return True
+
+
+def _filter_mask(column: pd.Series, op: str, value) -> np.ndarray:
+    """Same results as the filters applied while reading the .dbf, on decoded values"""
+    if op not in FILTER_OPS and op not in ('in', 'not in'):
+        raise ValueError(f'Unknown filter operator: {op!r}')
+
+    if pd.api.types.is_datetime64_any_dtype(column.dtype):
+        value = [pd.Timestamp(v) for v in value] if op in ('in', 'not in') else pd.Timestamp(value)
+    elif isinstance(column.dtype, pd.CategoricalDtype) and op not in ('==', '!=', 'in', 'not in'):
+        # Categories are unordered, compare their values
+        column = column.astype(object)
+
+    if op == 'in':
+        return column.isin(value).to_numpy()
+    elif op == 'not in':
+        return ~column.isin(value).to_numpy()
+    return FILTER_OPS[op](column, value).to_numpy(dtype=bool)
+
+
+def derive(df: pd.DataFrame, columns: list | None = None, filters: list | None = None) -> pd.DataFrame:
+    """Copy of the rows of df matching filters with columns, numbered from 0 like a read .dbf"""
+    if columns is None:
+        columns = list(df.columns)
+    else:
+        columns = [c for c in columns if c in df.columns]
+
+    if filters:
+        mask = np.ones(len(df), dtype=bool)
+        for column, op, value in filters:
+            mask &= _filter_mask(df[column], op, value)
+        df = df.loc[mask, columns]
+    else:
+        df = df[columns]
+
+    df.index = pd.RangeIndex(len(df))
+    return df
@@ -5,7 +5,6 @@ from typing import Literal
 
 def create_timeline_df(df: pd.DataFrame, date_col: str) -> pd.Series:
 
-    df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
     df = df.dropna(subset=[date_col])
     df.set_index(date_col, inplace=True)
 
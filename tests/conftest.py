@@ -0,0 +1,114 @@
+import os
+import struct
+import hashlib
+import datetime
+import threading
+import http.server
+import pytest
+
+
+def dbf_bytes(fields: list[tuple], records: list[tuple], deleted: set[int] = frozenset(),
+              updated: datetime.date = datetime.date(2026, 1, 15)) -> bytes:
+    """dBase III table in cp1252 with fields (name, type, length, decimal_count)"""
+    headerlen = 32 + 32 * len(fields) + 1
+    recordlen = 1 + sum(length for _, _, length, _ in fields)
+
+    header = struct.pack('<BBBBLHH', 0x03, updated.year - 1900, updated.month, updated.day,
+                         len(records), headerlen, recordlen)
+    # Language driver 0x03 is cp1252
+    header += bytes(17) + b'\x03' + bytes(2)
+    for name, field_type, length, decimal_count in fields:
+        header += struct.pack('<11scLBB14x', name.encode('ascii'), field_type.encode('ascii'), 0, length, decimal_count)
+    header += b'\x0d'
+
+    body = b''
+    for i, record in enumerate(records):
+        body += b'*' if i in deleted else b' '
+        for (_, field_type, length, decimal_count), value in zip(fields, record):
+            if value is None:
+                raw = b''
+            elif field_type == 'N':
+                raw = f'{value:.{decimal_count}f}'.encode('ascii').rjust(length)
+            elif field_type == 'D':
+                raw = value.strftime('%Y%m%d').encode('ascii')
+            elif field_type == 'L':
+                raw = b'T' if value else b'F'
+            else:
+                raw = value.encode('cp1252')
+            body += raw.ljust(length)[:length]
+
+    return header + body + b'\x1a'
+
+
+class ERPServer:
+    """Local HTTP server of .dbf files with ETag, If-None-Match and Range / If-Range support"""
+
+    def __init__(self, root: str, validators: bool = True):
+        self.root = root
+        self.validators = validators
+        # (Range header, status) of every request
+        self.requests = []
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.handle(self)
+
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, name: str) -> str:
+        return f'http://127.0.0.1:{self.httpd.server_port}/{name}'
+
+    def publish(self, name: str, data: bytes) -> None:
+        with open(os.path.join(self.root, name), 'wb') as f:
+            f.write(data)
+
+    def handle(self, request: http.server.BaseHTTPRequestHandler) -> None:
+        path = os.path.join(self.root, request.path.lstrip('/'))
+        if not os.path.isfile(path):
+            return self._reply(request, 404)
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        etag = '"%s"' % hashlib.md5(data).hexdigest() if self.validators else None
+        headers = {'ETag': etag} if etag else {}
+        if etag and request.headers.get('If-None-Match') == etag:
+            return self._reply(request, 304, headers=headers)
+
+        byte_range = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if byte_range and (if_range is None or if_range == etag):
+            start, _, end = byte_range.removeprefix('bytes=').partition('-')
+            start, end = int(start), min(int(end) if end else len(data) - 1, len(data) - 1)
+            headers['Content-Range'] = f'bytes {start}-{end}/{len(data)}'
+            return self._reply(request, 206, data[start:end + 1], headers)
+
+        self._reply(request, 200, data, headers)
+
+    def _reply(self, request, status: int, body: bytes = b'', headers: dict | None = None) -> None:
+        self.requests.append((request.headers.get('Range'), status))
+        request.send_response(status)
+        for key, value in (headers or {}).items():
+            request.send_header(key, value)
+        if status != 304:
+            request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+
+@pytest.fixture(params=[True, False], ids=['validators', 'no-validators'])
+def erp_server(request, tmp_path):
+    root = tmp_path / 'erp'
+    root.mkdir()
+    server = ERPServer(str(root), validators=request.param)
+    server.thread.start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
@@ -0,0 +1,111 @@
+import datetime
+import pandas as pd
+import pytest
+
+from dbfread import DBF
+
+from src.utils import dbf_reader
+from src.utils.dbf_reader import read_dbf, iter_dbf_chunks, DBFStreamDecoder
+from conftest import dbf_bytes
+
+FIELDS = [
+    ('CVE_PROD', 'C', 8, 0),
+    ('DESC_PROD', 'C', 24, 0),
+    ('CANTIDAD', 'N', 8, 0),
+    ('SALDO', 'N', 8, 0),
+    ('PRECIO', 'N', 12, 4),
+    ('F_ALTA', 'D', 8, 0),
+    ('ACTIVO', 'L', 1, 0),
+]
+
+RECORDS = [
+    ('A-001', 'Película estirable', 10, 4, 12.5, datetime.date(2026, 1, 2), True),
+    ('A-002', 'Bolsa camiseta', 250, None, 0.125, datetime.date(2025, 12, 31), False),
+    ('B-010', 'Ñandú  ', -3, 7, -45.0, None, True),
+    ('B-011', '', 0, 0, 1234567.1234, datetime.date(2026, 2, 28), False),
+    ('C-100', 'Resina', 99999999, 1, None, datetime.date(2026, 3, 1), True),
+    ('C-101', 'Cinta', 5, 2, 3.0, datetime.date(2026, 6, 30), False),
+]
+
+FILTERS = [
+    [('CVE_PROD', '>=', 'B')],
+    [('CANTIDAD', '>', 5), ('ACTIVO', '==', True)],
+    [('F_ALTA', '>=', datetime.date(2026, 1, 1))],
+    [('CVE_PROD', 'in', ['A-002', 'C-101']), ('F_ALTA', '!=', datetime.date(2026, 6, 30))],
+    [('DESC_PROD', 'not in', ['Resina'])],
+]
+
+
+@pytest.fixture
+def table(tmp_path):
+    path = tmp_path / 'producto.dbf'
+    # The deleted record must not come out of either reader
+    path.write_bytes(dbf_bytes(FIELDS, RECORDS, deleted={3}))
+    return path
+
+
+def dbfread_frame(path, columns=None, filters=None) -> pd.DataFrame:
+    df = pd.DataFrame(iter(DBF(path)))
+    for column, op, value in filters or []:
+        if op in ('in', 'not in'):
+            mask = df[column].isin(value)
+            mask = ~mask if op == 'not in' else mask
+        else:
+            # Empty values only pass !=, same as NaN
+            valid = df[column].notna()
+            mask = dbf_reader.FILTER_OPS[op](df[column].where(valid, value), value).astype(bool)
+            mask = mask | ~valid if op == '!=' else mask & valid
+        df = df[mask]
+    if columns is not None:
+        df = df[[field for field, *_ in FIELDS if field in columns]]
+    return df.reset_index(drop=True)
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_matches_dbfread(table, monkeypatch, mmap):
+    monkeypatch.setattr(dbf_reader, 'ERP_MMAP', mmap)
+    pd.testing.assert_frame_equal(read_dbf(table), dbfread_frame(table))
+
+
+def test_bytes_source_matches_dbfread(table):
+    pd.testing.assert_frame_equal(read_dbf(table.read_bytes()), dbfread_frame(table))
+
+
+def test_column_projection(table):
+    columns = ['PRECIO', 'CVE_PROD', 'F_ALTA']
+    pd.testing.assert_frame_equal(read_dbf(table, columns=columns), dbfread_frame(table, columns))
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_filters(table, filters):
+    columns = ['CVE_PROD', 'CANTIDAD']
+    pd.testing.assert_frame_equal(read_dbf(table, columns=columns, filters=filters),
+                                  dbfread_frame(table, columns, filters))
+
+
+def test_chunks(table):
+    chunks = list(iter_dbf_chunks(table, chunk_records=2))
+    assert len(chunks) == 3
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), dbfread_frame(table))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 1 << 16])
+def test_stream_decoder(table, chunk_size):
+    data = table.read_bytes()
+    decoder = DBFStreamDecoder()
+    for start in range(0, len(data), chunk_size):
+        decoder.feed(data[start:start + chunk_size])
+    pd.testing.assert_frame_equal(decoder.finish(), dbfread_frame(table))
+
+
+def test_parallel_ranges(table, monkeypatch):
+    monkeypatch.setattr(dbf_reader, 'ERP_PARALLEL_MIN_RECORDS', 0)
+    pd.testing.assert_frame_equal(read_dbf(table, processes=2), dbfread_frame(table))
+
+
+def test_empty_table(tmp_path):
+    path = tmp_path / 'vacia.dbf'
+    path.write_bytes(dbf_bytes(FIELDS, []))
+    df = read_dbf(path)
+    assert list(df.columns) == [field for field, *_ in FIELDS]
+    assert df.empty
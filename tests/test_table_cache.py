@@ -0,0 +1,94 @@
+import datetime
+import pytest
+
+from src.utils import table_cache
+from src.utils.table_cache import sync_table
+from conftest import dbf_bytes
+
+# facturac is in APPEND_ONLY_TABLES
+TABLE = 'facturac'
+FIELDS = [('NO_FAC', 'C', 6, 0), ('IMPORTE', 'N', 10, 2)]
+HEADERLEN = 32 + 32 * len(FIELDS) + 1
+RECORDLEN = 1 + 6 + 10
+
+
+def bills(count: int, first: int = 0) -> list[tuple]:
+    return [(f'{i:06d}', i * 1.5) for i in range(first, first + count)]
+
+
+def day(n: int) -> datetime.date:
+    return datetime.date(2026, 3, n)
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(table_cache, 'ERP_CACHE_DIR', str(tmp_path / 'cache'))
+
+
+def sync(server) -> bytes:
+    server.requests.clear()
+    with open(sync_table(TABLE, server.url(f'{TABLE}.dbf')), 'rb') as f:
+        return f.read()
+
+
+def test_downloads_only_appended_records(erp_server):
+    erp_server.publish(f'{TABLE}.dbf', dbf_bytes(FIELDS, bills(5), updated=day(1)))
+    sync(erp_server)
+
+    remote = dbf_bytes(FIELDS, bills(8), updated=day(2))
+    erp_server.publish(f'{TABLE}.dbf', remote)
+    assert sync(erp_server) == remote
+
+    # The header, then the last cached record along the three new ones
+    start = HEADERLEN + 4 * RECORDLEN
+    assert erp_server.requests == [
+        (f'bytes=0-{HEADERLEN - 1}', 206),
+        (f'bytes={start}-{start + 4 * RECORDLEN - 1}', 206),
+    ]
+
+
+def test_unchanged_table_is_not_downloaded(erp_server):
+    remote = dbf_bytes(FIELDS, bills(5), updated=day(1))
+    erp_server.publish(f'{TABLE}.dbf', remote)
+    sync(erp_server)
+
+    assert sync(erp_server) == remote
+    status = 304 if erp_server.validators else 206
+    assert erp_server.requests == [(f'bytes=0-{HEADERLEN - 1}', status)]
+
+
+@pytest.mark.parametrize('remote_records', [
+    # The last cached record was edited in place
+    bills(4) + [('000004', 99.0)] + bills(3, first=5),
+    # Records were removed
+    bills(3),
+], ids=['edited', 'removed'])
+def test_other_changes_download_whole_table(erp_server, remote_records):
+    erp_server.publish(f'{TABLE}.dbf', dbf_bytes(FIELDS, bills(5), updated=day(1)))
+    sync(erp_server)
+
+    remote = dbf_bytes(FIELDS, remote_records, updated=day(2))
+    erp_server.publish(f'{TABLE}.dbf', remote)
+    assert sync(erp_server) == remote
+    assert erp_server.requests[-1] == (None, 200)
+
+
+def test_changed_layout_downloads_whole_table(erp_server):
+    erp_server.publish(f'{TABLE}.dbf', dbf_bytes(FIELDS, bills(5), updated=day(1)))
+    sync(erp_server)
+
+    remote = dbf_bytes(FIELDS + [('CVE_CTE', 'C', 4, 0)], [bill + ('C001',) for bill in bills(8)], updated=day(2))
+    erp_server.publish(f'{TABLE}.dbf', remote)
+    assert sync(erp_server) == remote
+    assert erp_server.requests[-1] == (None, 200)
+
+
+def test_full_download_after_full_sync_hours(erp_server, monkeypatch):
+    erp_server.publish(f'{TABLE}.dbf', dbf_bytes(FIELDS, bills(5), updated=day(1)))
+    sync(erp_server)
+
+    monkeypatch.setattr(table_cache, 'ERP_FULL_SYNC_HOURS', 0)
+    remote = dbf_bytes(FIELDS, bills(8), updated=day(2))
+    erp_server.publish(f'{TABLE}.dbf', remote)
+    assert sync(erp_server) == remote
+    assert erp_server.requests == [(None, 200)]
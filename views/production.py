@@ -3,9 +3,10 @@ import seaborn as sns
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mtick
 
-from src.config import MONTHS, get_business_unit
+from src.config import MONTHS
 from src.data.resultados_prod import get_res_ops_df
 from src.data.productos import get_products_df
+from src.utils.dates_calculator import range_of_months_to_dates
 from src.utils.formatting import to_currency, to_kg
 
 
@@ -13,7 +14,7 @@ def render_production(month: str, curr_year: str, classes: list):
     
     # Get filtered data 
     filtered_month = MONTHS[month]
-    results = get_res_ops_df()
+    results = get_res_ops_df(*range_of_months_to_dates(filtered_month, curr_year, 1))
 
     # Filter results of current month and year
     res_df = results.loc[
@@ -29,7 +30,7 @@ def render_production(month: str, curr_year: str, classes: list):
     res_df.fillna({'FACT_PESO': 0}, inplace=True)
 
     #Assign business unit
-    res_df['UNIDAD_NEGOCIO'] = res_df['CSE_PROD'].apply(lambda x: get_business_unit(x))
+    res_df['UNIDAD_NEGOCIO'] = res_df['BU'].fillna('OTROS')
     
     # Filter classes
     if classes:
@@ -41,7 +42,9 @@ def render_production(month: str, curr_year: str, classes: list):
     res_df['COSTO_POR_KG'] = res_df['COSTO_TOTAL'] / res_df['KILOGRAMOS_PRODUCIDOS']
 
     # GET AVERGAE COST OF KG BY CLASS
-    resCls = res_df.groupby(['UNIDAD_NEGOCIO', 'CSE_PROD'], as_index=False)[['KILOGRAMOS_PRODUCIDOS', 'COSTO_TOTAL']].sum()
+    resCls = res_df.groupby(['UNIDAD_NEGOCIO', 'CSE_PROD'], as_index=False, observed=True)[['KILOGRAMOS_PRODUCIDOS', 'COSTO_TOTAL']].sum()
+    # Seaborn would draw a bar for every class of the categorical, produced or not
+    resCls['CSE_PROD'] = resCls['CSE_PROD'].astype(str)
     resCls['COSTO_PROMEDIO_KG'] = resCls['COSTO_TOTAL'] / resCls['KILOGRAMOS_PRODUCIDOS']
     resCls['Costo promedio por Kg'] = resCls['COSTO_PROMEDIO_KG'].apply(lambda x: to_currency(x))
     resCls['Kilogramos producidos'] = resCls['KILOGRAMOS_PRODUCIDOS'].apply(lambda x: to_kg(x))
@@ -109,10 +112,10 @@ def render_production(month: str, curr_year: str, classes: list):
         # Create chart based on selection
         # Create bar chart for production by business unit
         if productionChart == "KG":
-            pivotedDFCls = resCls.pivot_table(index='UNIDAD_NEGOCIO', columns='CSE_PROD', values='KILOGRAMOS_PRODUCIDOS', aggfunc="sum").fillna(0)
+            pivotedDFCls = resCls.pivot_table(index='UNIDAD_NEGOCIO', columns='CSE_PROD', values='KILOGRAMOS_PRODUCIDOS', aggfunc="sum", observed=True).fillna(0)
             productionTitle = 'Kilogramos producidos por unidad de negocio'
         else: 
-            pivotedDFCls = resCls.pivot_table(index='UNIDAD_NEGOCIO', columns='CSE_PROD', values='COSTO_TOTAL', aggfunc="sum").fillna(0)
+            pivotedDFCls = resCls.pivot_table(index='UNIDAD_NEGOCIO', columns='CSE_PROD', values='COSTO_TOTAL', aggfunc="sum", observed=True).fillna(0)
             productionTitle = 'Valor producido por unidad de negocio'
 
         paletteProd = sns.color_palette("Paired", n_colors=len(pivotedDFCls.columns))
@@ -231,6 +231,7 @@ def render_purchases(month : str, curr_year: str, business_units: list = None, m
                             'VALOR_MN', 'STATUS', 'FECH_ENT', 'NOM_PROV', 'FACT_PESO','F_ALTA_PED']]
             
             pos_df['VALOR_MN'] = pos_df['VALOR_MN'].apply(lambda x: to_currency(x))
+            pos_df['F_ALTA_PED'] = pos_df['F_ALTA_PED'].dt.date
             pos_df.sort_values('FECH_ENT', ascending=False, inplace=True)
             pos_df.rename(columns={
                 'CVE_PROD': 'CLAVE',
@@ -3,12 +3,14 @@ import numpy as np
 import matplotlib.pyplot as plt 
 import matplotlib.ticker as mtick
 
-from src.config import MONTHS, get_business_unit, get_past_month
+from src.config import MONTHS, get_past_month
+from src.data.business_units import business_units
 from src.utils.formatting import to_currency, to_kg, to_percentage
 from src.data.credits import get_credits_df, get_returns_df, get_discounts_df
 from src.data.facturas import get_facturas_df
 from src.data.clientes import get_clients_df
 from src.data.productos import get_products_df
+from src.utils.dates_calculator import range_of_months_to_dates
 
 from src.domain.billing_calcs import (get_net_billing, 
                                       get_billing_by_bu_and_cls,
@@ -20,10 +22,11 @@ from src.domain.billing_calcs import (get_net_billing,
 def render_sales(month: str, curr_year: str, classes: list = None):
 
     filtered_month = MONTHS[month]  
-    facturas = get_facturas_df()
+    # Only the bills of this month and the past one, and the credits of this month are loaded
+    facturas = get_facturas_df(True, *range_of_months_to_dates(filtered_month, curr_year, 2))
     clientes = get_clients_df()
     productos = get_products_df()
-    ret_and_disc = get_credits_df()
+    ret_and_disc = get_credits_df(*range_of_months_to_dates(filtered_month, curr_year, 1))
 
     pastMonth, corrYear = get_past_month(month, curr_year)
 
@@ -35,7 +38,7 @@ def render_sales(month: str, curr_year: str, classes: list = None):
     ].copy()
 
     filtered_ret_disc = ret_and_disc[(ret_and_disc['MES'] == filtered_month) & (ret_and_disc['AÑO'] == curr_year)]
-    discounts_df = get_discounts_df(filtered_ret_disc, facturas)
+    discounts_df = get_discounts_df(filtered_ret_disc)
     returns_df = get_returns_df(filtered_ret_disc, productos)
 
     if classes:
@@ -50,13 +53,13 @@ def render_sales(month: str, curr_year: str, classes: list = None):
 
     
     # DROP CVE_PROD FROM PRODUCTOS TO AVOID DUPLICATED COLUMNS
-    productos.drop(['CSE_PROD'], axis=1, inplace=True)
+    productos = productos.drop(['CSE_PROD', 'BU', 'BU_MP'], axis=1)
     maindf = maindf.join(productos, on='CVE_PROD')
     # replace null values
     maindf.fillna({'FACT_PESO': 0}, inplace=True) 
 
     # Assing business unit 
-    maindf['UNIDAD_NEGOCIO'] = maindf['CSE_PROD'].apply(lambda x: get_business_unit(x))
+    maindf['UNIDAD_NEGOCIO'] = maindf['BU']
     # Get total KG
     maindf['PESO_TOTAL'] = maindf['CANT_SURT'] * maindf['FACT_PESO']
 
@@ -65,19 +68,21 @@ def render_sales(month: str, curr_year: str, classes: list = None):
 
     maindf = maindf.loc[~mask_last_month]  
 
-    factByCls = maindf.groupby('CSE_PROD', as_index=False)[['FACTURADO', 'PESO_TOTAL']].sum()
+    factByCls = maindf.groupby('CSE_PROD', as_index=False, observed=True)[['FACTURADO', 'PESO_TOTAL']].sum()
     factByClient = maindf.groupby('NOM_CTE', as_index=False)[['FACTURADO', 'PESO_TOTAL']].sum()
 
     # Get discounts and returns by class 
-    discountsByCls = discounts_df.groupby(['CSE_PROD', 'CSE_DESCUENTO'], as_index=False)[['MONTO_MN']].sum()
+    discountsByCls = discounts_df.groupby(['CSE_PROD', 'CSE_DESCUENTO'], as_index=False, observed=True)[['MONTO_MN']].sum()
     discountsByCls = discountsByCls.pivot(index='CSE_PROD', columns='CSE_DESCUENTO',values='MONTO_MN')
     discountsByCls.reset_index(inplace=True)
-    returnsByCls = returns_df.groupby('CSE_PROD', as_index=False)[['PESO_TOTAL_DEV', 'DEVOLUCION_MN']].sum()
+    returnsByCls = returns_df.groupby('CSE_PROD', as_index=False, observed=True)[['PESO_TOTAL_DEV', 'DEVOLUCION_MN']].sum()
 
     # Add discounts and returns to factByCls 
     factByCls = factByCls.merge(discountsByCls, how='left', on='CSE_PROD')
     factByCls = factByCls.merge(returnsByCls, how='left', on='CSE_PROD')
-    factByCls = factByCls.fillna(0)
+    # Only the amounts, a categorical class column rejects the 0
+    amounts = factByCls.columns.drop('CSE_PROD')
+    factByCls[amounts] = factByCls[amounts].fillna(0)
 
      # CREATE COLUMNS OF DICOUNTS AND RETURNS IN CASE DOES NOT EXIST 
     for col in ['APLICACION ANTICIPO', 'DESCUENTO', 'PESO_TOTAL_DEV', 'DEVOLUCION_MN']:
@@ -89,7 +94,7 @@ def render_sales(month: str, curr_year: str, classes: list = None):
     negativesByCls['RESTA_FACT'] = -negativesByCls['APLICACION ANTICIPO'] - negativesByCls['DESCUENTO'] - negativesByCls['DEVOLUCION_MN']
     negativesByCls['RESTA_KG'] = -negativesByCls['PESO_TOTAL_DEV']
     negativesByCls = negativesByCls[['CSE_PROD', 'RESTA_FACT', 'RESTA_KG']]
-    negativesByCls['UNIDAD_NEGOCIO'] = negativesByCls['CSE_PROD'].apply(lambda x: get_business_unit(x))
+    negativesByCls['UNIDAD_NEGOCIO'] = business_units(negativesByCls['CSE_PROD'])
 
     # Set class as index
     factByCls.set_index('CSE_PROD', inplace=True)
@@ -329,7 +329,7 @@ def render_trend(month: str, curr_year: str, classes: list = None, agents_filter
                 'KG': to_kg
             }
             
-            agents_pivot_table = pivot_data.pivot_table(index='NOM_AGE', columns='BU', values=columns_dict[agentsChartUnits], aggfunc='sum', fill_value=0)
+            agents_pivot_table = pivot_data.pivot_table(index='NOM_AGE', columns='BU', values=columns_dict[agentsChartUnits], aggfunc='sum', fill_value=0, observed=True)
 
             # Sort agents by interest value
             agents_pivot_table['TTEMP'] = agents_pivot_table.sum(axis=1)